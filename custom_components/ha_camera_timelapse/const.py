@@ -29,9 +29,14 @@ DEFAULT_DEBUG = False  # Enable debug mode
 
 # Performance settings
 MAX_CONCURRENT_TASKS = 2  # 最大并发延时摄影任务数
-MAX_FRAME_BATCH = 1000  # 最大处理帧数量限制
 MAX_FFMPEG_THREADS = 2  # FFmpeg线程数限制
 
+# Video output settings
+TIMELAPSE_FPS = 10  # 输出视频帧率
+FFMPEG_PRESET = "veryfast"  # libx264 编码预设，静态场景下画质差异很小但编码更快
+MAX_VIDEO_DURATION = 300  # seconds, 与 FRAME_BLEND_THRESHOLD 共同决定帧合并的上限
+FRAME_BLEND_THRESHOLD = 4  # 视频时长超过 MAX_VIDEO_DURATION 的倍数时启用帧合并
+
 # Entity attributes
 ATTR_STATUS = "status"
 ATTR_PROGRESS = "progress"
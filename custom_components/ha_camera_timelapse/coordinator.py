@@ -3,30 +3,38 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import math
 import os
+import pathlib
+import re
+import shutil
+import subprocess
+import time
 import uuid
-import sys
-from datetime import datetime, timedelta
-import aiofiles
+from collections import deque
+from dataclasses import asdict, dataclass
+from itertools import islice
+from datetime import timedelta
 import aiohttp
-import aiofiles.os
-import urllib.request
-import requests
 from typing import Any, Dict, List, Optional, Tuple
-from functools import partial
 
 from .google_photos import async_upload_to_google_photos
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from homeassistant.exceptions import HomeAssistantError
-from homeassistant.components.camera import Image, async_get_image
+from homeassistant.components.camera import Image, async_get_image, async_get_stream_source
 import homeassistant.util.dt as dt_util
 
 from .const import (
     DOMAIN,
     CONF_CAMERA_ENTITY_ID,
+    CONF_DEFAULT_INTERVAL,
+    CONF_DEFAULT_DURATION,
+    CONF_DEFAULT_OUTPUT_PATH,
+    CONF_DEBUG_MODE,
     DEFAULT_INTERVAL,
     DEFAULT_DURATION,
     DEFAULT_OUTPUT_PATH,
@@ -38,8 +46,11 @@ from .const import (
     STATUS_ERROR,
     ATTR_TASKS,
     MAX_CONCURRENT_TASKS,
-    MAX_FRAME_BATCH,
     MAX_FFMPEG_THREADS,
+    TIMELAPSE_FPS,
+    FFMPEG_PRESET,
+    MAX_VIDEO_DURATION,
+    FRAME_BLEND_THRESHOLD,
     CONF_UPLOAD_TO_GOOGLE_PHOTOS,
     CONF_GOOGLE_PHOTOS_ALBUM,
     CONF_GOOGLE_PHOTOS_CONFIG_ENTRY_ID,
@@ -50,6 +61,319 @@ from .const import (
 
 _LOGGER = logging.getLogger(__name__)
 
+# Frame capture strategies: the Home Assistant camera API, or reading the
+# camera's HTTP stream source directly. Keyed by the last strategy that
+# worked for a camera, giving the order to try them in.
+_STRATEGY_API = "api"
+_STRATEGY_STREAM = "stream"
+_STRATEGY_ORDER = {
+    None: (_STRATEGY_API, _STRATEGY_STREAM),
+    _STRATEGY_API: (_STRATEGY_API, _STRATEGY_STREAM),
+    _STRATEGY_STREAM: (_STRATEGY_STREAM, _STRATEGY_API),
+}
+
+# Delay before each capture retry: 2s base with 1.5x backoff
+_RETRY_DELAYS = (2.0, 3.0, 4.5)
+
+# Where to look for ffmpeg when it is not on PATH
+_FFMPEG_COMMON_PATHS = (
+    "/usr/bin/ffmpeg",
+    "/usr/local/bin/ffmpeg",
+    "/bin/ffmpeg",
+    "/opt/bin/ffmpeg",
+    "/usr/sbin/ffmpeg",
+)
+
+# H.264 encoders in order of preference; hardware encoders are only used if
+# a short test encode succeeds, otherwise libx264 is used
+_HW_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_vaapi", "h264_v4l2m2m")
+_SW_ENCODER = "libx264"
+_VAAPI_DEVICE = "/dev/dri/renderD128"
+
+# Per-encoder ffmpeg arguments: options placed before the input, filters
+# appended to the -vf chain, and quality/format options after -c:v
+_ENCODER_INPUT_ARGS = {
+    "h264_vaapi": ("-vaapi_device", _VAAPI_DEVICE),
+}
+_ENCODER_FILTERS = {
+    "h264_vaapi": "format=nv12,hwupload",
+}
+_ENCODER_OUTPUT_ARGS = {
+    "libx264": (
+        "-tune", "stillimage",  # 场景变化缓慢，提高压缩率
+        "-preset", FFMPEG_PRESET,
+        "-crf", "23",
+        "-pix_fmt", "yuv420p",
+        "-profile:v", "high",
+        "-level", "4.0",
+    ),
+    "h264_nvenc": (
+        "-rc", "vbr",
+        "-cq", "23",
+        "-b:v", "0",
+        "-pix_fmt", "yuv420p",
+        "-profile:v", "high",
+    ),
+    "h264_qsv": (
+        "-global_quality", "23",
+        "-pix_fmt", "nv12",
+        "-profile:v", "high",
+    ),
+    "h264_vaapi": (
+        "-qp", "23",
+    ),
+    "h264_v4l2m2m": (
+        # v4l2m2m 只支持码率控制，不设置时默认约 200 kb/s，画质很差
+        "-b:v", "4M",
+        "-pix_fmt", "yuv420p",
+    ),
+}
+
+# ffmpeg's tmix filter accepts at most 1024 input frames
+_MAX_BLEND_FRAMES = 1024
+
+# Stream sources that ffmpeg can sample directly instead of saving snapshots
+_RTSP_SCHEMES = ("rtsp://", "rtsps://")
+
+# StreamReader buffer for the encode process pipes (default is 64 KiB)
+_FFMPEG_PIPE_LIMIT = 1 << 20
+
+# Non-progress stderr lines kept for the error report of a failed encode
+_FFMPEG_ERROR_LINES = 20
+
+# Seconds to wait for ffmpeg to finalize the video after asking it to quit
+_FFMPEG_STOP_TIMEOUT = 15
+
+# RTSP socket timeout, after which ffmpeg gives up on a stalled camera
+_RTSP_SOCKET_TIMEOUT = 10  # seconds
+
+# Seconds a stream encode may run past its duration before it is stopped
+_STREAM_STOP_GRACE = 60
+
+# User info (user:password@) of URLs that ffmpeg echoes in its error output
+_URL_CREDENTIALS = re.compile(r"(?<=://)[^/\s]+@")
+
+# Placeholders in the cached ffmpeg command templates, replaced per encode
+_ARG_INPUT = "__INPUT__"
+_ARG_START_NUMBER = "__START_NUMBER__"
+_ARG_FILTERS = "__FILTERS__"
+_ARG_CREATION_TIME = "__CREATION_TIME__"
+_ARG_OUTPUT = "__OUTPUT__"
+
+# Input arguments for contiguously numbered frames (image2 pattern) and
+# for frame lists with gaps (concat list on stdin, 1/TIMELAPSE_FPS per frame)
+_PATTERN_INPUT_ARGS = (
+    "-framerate", str(TIMELAPSE_FPS),  # 输入帧率
+    "-start_number", _ARG_START_NUMBER,  # 起始帧编号
+    "-i", _ARG_INPUT,  # 输入模式
+)
+_CONCAT_INPUT_ARGS = (
+    "-f", "concat",
+    "-safe", "0",
+    "-protocol_whitelist", "file,pipe",
+    "-i", "pipe:0",  # 从stdin读取文件列表
+)
+
+# 限制同时运行的帧编码进程数，避免多个摄像头同时结束时CPU过载
+_ENCODE_SEMAPHORE = asyncio.Semaphore(max(1, (os.cpu_count() or 1) // MAX_FFMPEG_THREADS))
+
+# Google Photos 上传服务会把整个视频读入内存，所有摄像头共用一个上传槽位
+_UPLOAD_SEMAPHORE = asyncio.Semaphore(1)
+
+
+def _frame_blend_factor(frame_count: int) -> int:
+    """Return how many consecutive frames to average into one output frame.
+
+    Blending only kicks in when the video would otherwise run more than
+    FRAME_BLEND_THRESHOLD times longer than MAX_VIDEO_DURATION; averaging
+    neighbouring frames also smooths exposure flicker. The factor grows
+    one step at a time with the frame count, so the output never drops
+    below half of that limit once blending starts.
+    """
+    max_frames = MAX_VIDEO_DURATION * FRAME_BLEND_THRESHOLD * TIMELAPSE_FPS
+    return min(max(math.ceil(frame_count / max_frames), 1), _MAX_BLEND_FRAMES)
+
+
+def _write_bytes(path: str, data: bytes) -> int:
+    """Write data to a file and return the number of bytes written."""
+    with open(path, "wb") as f:
+        return f.write(data)
+
+
+def _prepare_paths(output_path: str, camera_name: str) -> Tuple[str, str]:
+    """Create the frame directory and return (frame_dir, output_file)."""
+    base = pathlib.Path(output_path)
+    base.mkdir(parents=True, exist_ok=True)
+    if os.access(base, os.W_OK):
+        _LOGGER.debug("Output directory has write permissions: %s", output_path)
+    else:
+        _LOGGER.warning("No write permission for output directory: %s", output_path)
+        _LOGGER.warning("Timelapse video may fail to save. Check directory permissions.")
+    
+    # Generate filename with timestamp
+    name = f"timelapse_{camera_name}_{time.strftime('%Y%m%d_%H%M%S')}"
+    frame_dir = base / name
+    frame_dir.mkdir(exist_ok=True)
+    return str(frame_dir), str(base / f"{name}.mp4")
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """Hard-link src to dst, or copy it when they are on different filesystems.
+
+    shutil.copyfile uses os.sendfile on Linux, so the copy never passes the
+    file contents through Python.
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _locate_ffmpeg() -> Tuple[Optional[str], Optional[str]]:
+    """Find the ffmpeg binary and return (path, first line of -version)."""
+    ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        ffmpeg_path = next(
+            (path for path in _FFMPEG_COMMON_PATHS if os.access(path, os.X_OK)), None
+        )
+        if not ffmpeg_path:
+            return None, None
+    
+    try:
+        result = subprocess.run(
+            [ffmpeg_path, "-version"], capture_output=True, timeout=10, check=False
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ffmpeg_path, None
+    if result.returncode != 0:
+        return ffmpeg_path, None
+    return ffmpeg_path, result.stdout.decode(errors="replace").partition("\n")[0]
+
+
+def _scan_frames(frame_dir: str) -> List[str]:
+    """Return the sorted names of all captured frames in frame_dir."""
+    with os.scandir(frame_dir) as it:
+        return sorted(
+            entry.name for entry in it
+            if entry.name.startswith("frame_") and entry.name.endswith(".jpg")
+        )
+
+
+def _scan_frame_range(frame_dir: str) -> Tuple[int, int, int]:
+    """Return (count, first, last) of the frame numbers in frame_dir."""
+    count = 0
+    first = last = -1
+    with os.scandir(frame_dir) as it:
+        for entry in it:
+            name = entry.name
+            if name.startswith("frame_") and name.endswith(".jpg"):
+                number = int(name[6:-4])
+                count += 1
+                if first < 0 or number < first:
+                    first = number
+                if number > last:
+                    last = number
+    return count, first, last
+
+
+def _sample_frames(frame_dir: str, limit: int) -> List[Tuple[str, int]]:
+    """Return (name, size) for up to limit frames, without listing them all."""
+    with os.scandir(frame_dir) as it:
+        frames = (
+            entry for entry in it
+            if entry.name.startswith("frame_") and entry.name.endswith(".jpg")
+        )
+        return [(entry.name, entry.stat().st_size) for entry in islice(frames, limit)]
+
+
+def _redact_credentials(text: str) -> str:
+    """Return text with the user info of any URL in it masked."""
+    return _URL_CREDENTIALS.sub("****:****@", text)
+
+
+def _build_ffmpeg_cmd(
+    ffmpeg_path: str,
+    encoder: str,
+    input_args: Tuple[str, ...],
+    filter_option: str = "-vf",
+    loglevel: str = "warning",
+    progress: bool = True
+) -> Tuple[str, ...]:
+    """Return the ffmpeg command reading input_args and encoding with encoder.
+    
+    Every encode shares the same output options. filter_option is -vf or
+    -filter_complex; per-encode values are left as _ARG_* placeholders.
+    """
+    return (
+        ffmpeg_path,
+        "-y",  # 覆盖现有文件
+        "-hide_banner",
+        "-loglevel", loglevel,  # 只输出警告或错误，减少stderr数据量
+        *(("-progress", "pipe:2") if progress else ()),  # 在stderr输出 key=value 格式的进度
+        "-nostats",
+        *_ENCODER_INPUT_ARGS.get(encoder, ()),  # 硬件编码器设备
+        *input_args,  # 输入方式相关参数
+        filter_option, _ARG_FILTERS,  # 帧合并及硬件上传滤镜
+        "-c:v", encoder,  # 视频编码器
+        *_ENCODER_OUTPUT_ARGS[encoder],  # 编码器质量及像素格式参数
+        "-threads", str(MAX_FFMPEG_THREADS),  # 使用配置常量限制线程数
+        "-r", str(TIMELAPSE_FPS),  # 输出帧率，所有编码保持一致
+        "-movflags", "+frag_keyframe+empty_moov+default_base_moof",  # 分片MP4，无需结束时重写文件
+        "-metadata", _ARG_CREATION_TIME,  # 添加创建时间元数据
+        "-metadata", "encoder=Home Assistant Camera Timelapse",  # 添加编码器信息
+        _ARG_OUTPUT,
+    )
+
+
+def _build_cmd_templates(ffmpeg_path: str, encoder: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Return the (pattern, concat) ffmpeg command templates for encoder."""
+    return (
+        _build_ffmpeg_cmd(ffmpeg_path, encoder, _PATTERN_INPUT_ARGS),
+        _build_ffmpeg_cmd(ffmpeg_path, encoder, _CONCAT_INPUT_ARGS),
+    )
+
+
+@dataclass(slots=True)
+class TimelapseRecord:
+    """State of a single timelapse task.
+
+    The same instance is referenced from both the per-camera map and the
+    task registry, so updates only need to be applied once.
+    """
+
+    task_id: str
+    camera_entity_id: str
+    interval: int
+    duration: int
+    output_path: str
+    frame_dir: str
+    output_file: str
+    start_time: str
+    end_time: str
+    status: str = STATUS_RECORDING
+    frames_captured: int = 0
+    progress: int = 0
+    time_remaining: int = 0  # in seconds
+    error_message: str = ""  # Will be populated if an error occurs
+    media_url: Optional[str] = None
+    google_photos_uploaded: bool = False
+    streaming: bool = False  # encoded directly from the RTSP stream, no frame files
+    stream_part: Optional[str] = None  # stream video recorded before falling back to snapshots
+
+    def as_task_summary(self) -> Dict[str, Any]:
+        """Return the subset of fields exposed in task listings."""
+        return {
+            "task_id": self.task_id,
+            "camera_entity_id": self.camera_entity_id,
+            "status": self.status,
+            "start_time": self.start_time,
+            "progress": self.progress,
+            "frames_captured": self.frames_captured,
+            "output_file": self.output_file,
+            "media_url": self.media_url or "",
+        }
+
+
 class TimelapseCoordinator(DataUpdateCoordinator):
     """Class to manage fetching data from the API."""
 
@@ -59,34 +383,24 @@ class TimelapseCoordinator(DataUpdateCoordinator):
         self.config_entry = entry
         self.camera_entity_id = entry.data.get(CONF_CAMERA_ENTITY_ID)
         self._timelapse_tasks = {}
-        self._timelapse_data = {}
-        self._task_registry = {}  # New task registry for management
-        self._debug = entry.options.get("debug", DEFAULT_DEBUG)
-        
-        # Google Photos 上传设置
-        self._upload_to_google_photos_enabled = entry.options.get(
-            CONF_UPLOAD_TO_GOOGLE_PHOTOS, 
-            entry.data.get(CONF_UPLOAD_TO_GOOGLE_PHOTOS, DEFAULT_UPLOAD_TO_GOOGLE_PHOTOS)
-        )
-        self._google_photos_album = entry.options.get(
-            CONF_GOOGLE_PHOTOS_ALBUM, 
-            entry.data.get(CONF_GOOGLE_PHOTOS_ALBUM, DEFAULT_GOOGLE_PHOTOS_ALBUM)
-        )
-        self._google_photos_config_entry_id = entry.options.get(
-            CONF_GOOGLE_PHOTOS_CONFIG_ENTRY_ID, 
-            entry.data.get(CONF_GOOGLE_PHOTOS_CONFIG_ENTRY_ID, DEFAULT_GOOGLE_PHOTOS_CONFIG_ENTRY_ID)
-        )
+        # Latest record per camera entity and all records by task ID; both
+        # maps share the same TimelapseRecord instances. _timelapse_data is
+        # also the coordinator data, with the task list under ATTR_TASKS.
+        self._timelapse_data: Dict[str, Any] = {}
+        self._task_registry: Dict[str, TimelapseRecord] = {}
+        # Serializes snapshot requests so concurrent tasks don't hit one camera at once
+        self._camera_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Last capture strategy that worked for each camera
+        self._strategy_cache: Dict[str, str] = {}
+        # ffmpeg binary and H.264 encoder, located on first video generation
+        self._ffmpeg_path: Optional[str] = None
+        self._video_encoder: Optional[str] = None
+        # (pattern, concat) ffmpeg command templates for the detected encoder
+        self._cmd_templates: Optional[Tuple[Tuple[str, ...], Tuple[str, ...]]] = None
         
-        # 检查Python版本并实现to_thread兼容函数
-        self.python_version = sys.version_info
-        if self.python_version < (3, 9):
-            # Python 3.8或更低版本，创建自己的to_thread函数
-            _LOGGER.info("Running on Python %s.%s, using custom to_thread implementation", 
-                        self.python_version.major, self.python_version.minor)
-            self.to_thread = self._to_thread_compat
-        else:
-            # Python 3.9+，使用内置的to_thread
-            self.to_thread = asyncio.to_thread
+        # Resolve configured defaults once and again whenever options change
+        self._resolve_options()
+        entry.async_on_unload(entry.add_update_listener(self._async_entry_updated))
         
         # 减少更新频率以降低系统负载，从10秒改为30秒
         update_interval = timedelta(seconds=30)
@@ -98,24 +412,42 @@ class TimelapseCoordinator(DataUpdateCoordinator):
             update_interval=update_interval,
         )
 
+    def _option(self, key: str, default: Any) -> Any:
+        """Return a config value, preferring options over initial config data."""
+        entry = self.config_entry
+        return entry.options.get(key, entry.data.get(key, default))
+
+    def _resolve_options(self) -> None:
+        """Cache the configured defaults from the config entry."""
+        self._default_interval: int = self._option(CONF_DEFAULT_INTERVAL, DEFAULT_INTERVAL)
+        self._default_duration: int = self._option(CONF_DEFAULT_DURATION, DEFAULT_DURATION)
+        self._default_output_path: str = self._option(CONF_DEFAULT_OUTPUT_PATH, DEFAULT_OUTPUT_PATH)
+        self._debug: bool = self._option(CONF_DEBUG_MODE, DEFAULT_DEBUG)
+        
+        # Google Photos 上传设置
+        self._upload_gp_enabled: bool = self._option(
+            CONF_UPLOAD_TO_GOOGLE_PHOTOS, DEFAULT_UPLOAD_TO_GOOGLE_PHOTOS
+        )
+        self._google_photos_album: str = self._option(
+            CONF_GOOGLE_PHOTOS_ALBUM, DEFAULT_GOOGLE_PHOTOS_ALBUM
+        )
+        self._google_photos_config_entry_id: Optional[str] = self._option(
+            CONF_GOOGLE_PHOTOS_CONFIG_ENTRY_ID, DEFAULT_GOOGLE_PHOTOS_CONFIG_ENTRY_ID
+        )
+
+    async def _async_entry_updated(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        """Refresh cached defaults after the options flow updates the entry."""
+        _LOGGER.debug("Options updated for %s, reloading defaults", entry.entry_id)
+        self._resolve_options()
+
     async def _async_update_data(self) -> Dict[str, Any]:
         """Update data."""
-        # Return the current state of all timelapses
-        data = self._timelapse_data.copy()
+        # Return the current state of all timelapses; coordinator data is
+        # read-only for listeners, so the live dict is returned without a copy
+        data = self._timelapse_data
         
         # Add task registry information
-        task_list = []
-        for task_id, task_info in self._task_registry.items():
-            task_list.append({
-                "task_id": task_id,
-                "camera_entity_id": task_info.get("camera_entity_id"),
-                "status": task_info.get("status"),
-                "start_time": task_info.get("start_time"),
-                "progress": task_info.get("progress", 0),
-                "frames_captured": task_info.get("frames_captured", 0),
-            })
-        
-        data[ATTR_TASKS] = task_list
+        data[ATTR_TASKS] = [rec.as_task_summary() for rec in self._task_registry.values()]
         return data
 
     async def start_timelapse(
@@ -150,7 +482,7 @@ class TimelapseCoordinator(DataUpdateCoordinator):
             # Try to get a test image to verify camera access (使用更短的超时)
             _LOGGER.info("Testing camera access for %s", camera_entity_id)
             try:
-                test_image = await async_get_image(self.hass, camera_entity_id, timeout=7)
+                test_image = await self._async_get_camera_image(camera_entity_id)
                 _LOGGER.info("Camera test successful: received image of %d bytes", 
                            len(test_image.content) if test_image and test_image.content else 0)
             except Exception as e:
@@ -167,90 +499,64 @@ class TimelapseCoordinator(DataUpdateCoordinator):
             
         # Use defaults from config if not specified
         if interval is None:
-            interval = self.config_entry.options.get(
-                "default_interval", 
-                self.config_entry.data.get("default_interval", DEFAULT_INTERVAL)
-            )
+            interval = self._default_interval
         if duration is None:
-            duration = self.config_entry.options.get(
-                "default_duration", 
-                self.config_entry.data.get("default_duration", DEFAULT_DURATION)
-            )
+            duration = self._default_duration
         if output_path is None:
-            output_path = self.config_entry.options.get(
-                "default_output_path", 
-                self.config_entry.data.get("default_output_path", DEFAULT_OUTPUT_PATH)
-            )
+            output_path = self._default_output_path
         
-        # Ensure output directory exists and check permissions
+        # Create the frame directory and pick the output file name off the event loop
+        _, _, camera_name = camera_entity_id.partition(".")
         try:
-            os.makedirs(output_path, exist_ok=True)
-            
-            # Test write permissions by creating a test file
-            test_file = os.path.join(output_path, ".permission_test")
-            try:
-                with open(test_file, "w") as f:
-                    f.write("test")
-                os.remove(test_file)
-                _LOGGER.debug("Output directory has write permissions: %s", output_path)
-            except PermissionError:
-                _LOGGER.warning("No write permission for output directory: %s", output_path)
-                _LOGGER.warning("Timelapse video may fail to save. Check directory permissions.")
-        except Exception as e:
+            frame_dir, output_file = await asyncio.to_thread(_prepare_paths, output_path, camera_name)
+        except OSError as e:
             _LOGGER.error("Error creating output directory %s: %s", output_path, e)
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        camera_name = camera_entity_id.split(".")[1]
-        frame_dir = os.path.join(output_path, f"timelapse_{camera_name}_{timestamp}")
-        os.makedirs(frame_dir, exist_ok=True)
-        
-        output_file = os.path.join(output_path, f"timelapse_{camera_name}_{timestamp}.mp4")
+            raise HomeAssistantError(f"Error creating output directory {output_path}: {e}") from e
         
         # Generate a unique task ID
         task_id = str(uuid.uuid4())
         
-        # Initialize timelapse data
-        timelapse_data = {
-            "task_id": task_id,
-            "status": STATUS_RECORDING,
-            "camera_entity_id": camera_entity_id,
-            "interval": interval,
-            "duration": duration,
-            "output_path": output_path,
-            "frame_dir": frame_dir,
-            "output_file": output_file,
-            "start_time": dt_util.now().isoformat(),
-            "end_time": (dt_util.now() + timedelta(minutes=duration)).isoformat(),
-            "frames_captured": 0,
-            "progress": 0,
-            "time_remaining": duration * 60,  # in seconds
-            "error_message": "",  # Will be populated if an error occurs
-        }
-        
-        self._timelapse_data[camera_entity_id] = timelapse_data
-        
-        # Register the task in the task registry
-        self._task_registry[task_id] = {
-            "camera_entity_id": camera_entity_id,
-            "status": STATUS_RECORDING,
-            "start_time": dt_util.now().isoformat(),
-            "progress": 0,
-            "frames_captured": 0,
-            "output_file": output_file
-        }
+        # Initialize timelapse data and register the task
+        now = dt_util.now()
+        rec = TimelapseRecord(
+            task_id=task_id,
+            camera_entity_id=camera_entity_id,
+            interval=interval,
+            duration=duration,
+            output_path=output_path,
+            frame_dir=frame_dir,
+            output_file=output_file,
+            start_time=now.isoformat(),
+            end_time=(now + timedelta(minutes=duration)).isoformat(),
+            time_remaining=duration * 60,
+        )
+        self._timelapse_data[camera_entity_id] = self._task_registry[task_id] = rec
         
-        # Start timelapse task
-        task = self.hass.async_create_task(
-            self._capture_timelapse(
-                task_id,
+        # 摄像头提供 RTSP 流时由 ffmpeg 直接按间隔采样编码，不再保存 JPEG 帧
+        stream_source = await self._async_get_rtsp_source(camera_entity_id)
+        if stream_source:
+            rec.streaming = True
+            capture = self._capture_stream_timelapse(
+                rec,
+                camera_entity_id,
+                stream_source,
+                interval,
+                duration,
+                frame_dir,
+                output_file
+            )
+        else:
+            capture = self._capture_timelapse(
+                rec,
                 camera_entity_id, 
                 interval, 
                 duration, 
                 frame_dir, 
                 output_file
             )
-        )
+        
+        # Start timelapse task
+        task = self.hass.async_create_task(capture)
         self._timelapse_tasks[camera_entity_id] = task
         
         await self.async_request_refresh()
@@ -265,59 +571,53 @@ class TimelapseCoordinator(DataUpdateCoordinator):
                 _LOGGER.error("Task ID %s does not exist", task_id)
                 raise HomeAssistantError(f"Task ID {task_id} does not exist")
                 
-            task_camera_id = self._task_registry[task_id].get("camera_entity_id")
+            task_camera_id = self._task_registry[task_id].camera_entity_id
             if task_camera_id != entity_id:
                 _LOGGER.error("Task ID %s does not match camera entity %s", task_id, entity_id)
                 raise HomeAssistantError(f"Task ID {task_id} does not match camera entity {entity_id}")
                 
         if entity_id in self._timelapse_tasks and not self._timelapse_tasks[entity_id].done():
-            # Get frame directory and output file path before cancelling task
-            frame_dir = None
-            output_file = None
-            if entity_id in self._timelapse_data:
-                frame_dir = self._timelapse_data[entity_id].get("frame_dir")
-                output_file = self._timelapse_data[entity_id].get("output_file")
-                task_id = self._timelapse_data[entity_id].get("task_id")
-                
+            # Get the record before cancelling task
+            rec = self._timelapse_data.get(entity_id)
+            if rec:
                 # Update status to processing
-                self._timelapse_data[entity_id]["status"] = STATUS_PROCESSING
-                self._timelapse_data[entity_id]["time_remaining"] = 0
-                
-                # Update task registry
-                if task_id and task_id in self._task_registry:
-                    self._task_registry[task_id]["status"] = STATUS_PROCESSING
-                    self._task_registry[task_id]["progress"] = 99  # Processing status
+                rec.status = STATUS_PROCESSING
+                rec.time_remaining = 0
+                rec.progress = 99  # Processing status
                 
                 await self.async_request_refresh()
             
             # Cancel the ongoing task
-            self._timelapse_tasks[entity_id].cancel()
+            task = self._timelapse_tasks[entity_id]
+            task.cancel()
             
             # If we have captured frames, generate the video
-            if frame_dir and output_file:
+            if rec and rec.frame_dir and rec.output_file:
                 _LOGGER.info("Generating timelapse video from manually stopped recording")
                 try:
-                    # Generate timelapse video with captured frames and clean up frames
-                    media_url = await self._generate_timelapse(frame_dir, output_file, cleanup_frames=True)
+                    if rec.streaming:
+                        # The capture task stops ffmpeg, which finalizes the video itself
+                        try:
+                            await task
+                        except asyncio.CancelledError:
+                            pass
+                        media_url = await self._publish_timelapse(rec.frame_dir, rec.output_file)
+                    else:
+                        # Generate timelapse video with captured frames and clean up frames
+                        media_url = await self._generate_timelapse(rec.frame_dir, rec.output_file, cleanup_frames=True, rec=rec)
                     
                     # Update status and add media URL for frontend playback
-                    self._timelapse_data[entity_id]["status"] = STATUS_IDLE
-                    self._timelapse_data[entity_id]["progress"] = 100
-                    
-                    # Update task registry
-                    if task_id and task_id in self._task_registry:
-                        self._task_registry[task_id]["status"] = STATUS_IDLE
-                        self._task_registry[task_id]["progress"] = 100
-                        self._task_registry[task_id]["media_url"] = media_url
+                    rec.status = STATUS_IDLE
+                    rec.progress = 100
                     
                     if media_url:
-                        self._timelapse_data[entity_id]["media_url"] = media_url
-                        _LOGGER.info("Timelapse completed and saved to: %s", output_file)
+                        rec.media_url = media_url
+                        _LOGGER.info("Timelapse completed and saved to: %s", rec.output_file)
                         
                         # 如果启用了 Google Photos 上传，上传视频
-                        if self._upload_to_google_photos_enabled:
+                        if self._upload_gp_enabled:
                             _LOGGER.info("尝试上传视频到 Google Photos")
-                            success = await self._upload_to_google_photos(output_file, task_id)
+                            success = await self._do_google_photos_upload(rec.output_file, rec.task_id)
                             if success:
                                 _LOGGER.info("成功上传视频到 Google Photos")
                             else:
@@ -326,22 +626,12 @@ class TimelapseCoordinator(DataUpdateCoordinator):
                 except Exception as e:
                     _LOGGER.error("Error generating timelapse after manual stop: %s", e)
                     _LOGGER.exception("Detailed timelapse error information")
-                    self._timelapse_data[entity_id]["status"] = STATUS_ERROR
-                    self._timelapse_data[entity_id]["error_message"] = str(e)
-                    
-                    # Update task registry
-                    if task_id and task_id in self._task_registry:
-                        self._task_registry[task_id]["status"] = STATUS_ERROR
-                        self._task_registry[task_id]["error_message"] = str(e)
-            else:
+                    rec.status = STATUS_ERROR
+                    rec.error_message = str(e)
+            elif rec:
                 # If no frames were captured or paths not available, just set to idle
-                self._timelapse_data[entity_id]["status"] = STATUS_IDLE
-                self._timelapse_data[entity_id]["progress"] = 0
-                
-                # Update task registry
-                if task_id and task_id in self._task_registry:
-                    self._task_registry[task_id]["status"] = STATUS_IDLE
-                    self._task_registry[task_id]["progress"] = 0
+                rec.status = STATUS_IDLE
+                rec.progress = 0
             
             await self.async_request_refresh()
             
@@ -351,27 +641,75 @@ class TimelapseCoordinator(DataUpdateCoordinator):
         if task_id not in self._task_registry:
             raise HomeAssistantError(f"Task ID {task_id} does not exist")
             
-        return self._task_registry[task_id]
+        return asdict(self._task_registry[task_id])
     
     async def list_tasks(self) -> List[Dict[str, Any]]:
         """List all timelapse tasks."""
-        tasks = []
-        for task_id, task_info in self._task_registry.items():
-            tasks.append({
-                "task_id": task_id,
-                "camera_entity_id": task_info.get("camera_entity_id"),
-                "status": task_info.get("status"),
-                "start_time": task_info.get("start_time"),
-                "frames_captured": task_info.get("frames_captured", 0),
-                "progress": task_info.get("progress", 0),
-                "output_file": task_info.get("output_file", ""),
-                "media_url": task_info.get("media_url", ""),
-            })
-        return tasks
+        return [rec.as_task_summary() for rec in self._task_registry.values()]
+    
+    async def _async_get_camera_image(self, camera_entity_id: str) -> Image:
+        """Fetch a snapshot, allowing only one request per camera at a time."""
+        sem = self._camera_semaphores.get(camera_entity_id)
+        if sem is None:
+            sem = self._camera_semaphores[camera_entity_id] = asyncio.Semaphore(1)
+        async with sem:
+            return await async_get_image(self.hass, camera_entity_id, timeout=7)
+    
+    async def _async_fetch_stream_frame(self, camera_entity_id: str) -> Optional[bytes]:
+        """Read a frame directly from the camera's HTTP stream source."""
+        stream_source = await async_get_stream_source(self.hass, camera_entity_id)
+        if not stream_source or not stream_source.startswith(("http://", "https://")):
+            return None
+        
+        session = async_get_clientsession(self.hass)
+        async with session.get(stream_source, timeout=aiohttp.ClientTimeout(total=7)) as resp:
+            if resp.status != 200:
+                return None
+            return await resp.read()
+    
+    async def _async_get_rtsp_source(self, camera_entity_id: str) -> Optional[str]:
+        """Return the camera's RTSP stream source, or None if it has none."""
+        try:
+            stream_source = await async_get_stream_source(self.hass, camera_entity_id)
+        except Exception as err:
+            _LOGGER.debug("Could not get stream source for %s: %s", camera_entity_id, err)
+            return None
+        if stream_source and stream_source.startswith(_RTSP_SCHEMES):
+            return stream_source
+        return None
+    
+    async def _capture_one_frame(self, camera_entity_id: str, fallback: bool = True) -> Optional[bytes]:
+        """Capture one frame, trying the strategy that last worked first.
+        
+        The remaining strategies are only tried when fallback is True.
+        """
+        preferred = self._strategy_cache.get(camera_entity_id)
+        strategies = _STRATEGY_ORDER[preferred]
+        if not fallback:
+            strategies = strategies[:1]
+        
+        for strategy in strategies:
+            try:
+                if strategy == _STRATEGY_API:
+                    image = await self._async_get_camera_image(camera_entity_id)
+                    content = image.content if image else None
+                else:
+                    content = await self._async_fetch_stream_frame(camera_entity_id)
+            except Exception as err:
+                _LOGGER.warning("Capture via %s failed for %s: %s", strategy, camera_entity_id, err)
+                continue
+            
+            if content:
+                if strategy != preferred:
+                    _LOGGER.info("Using %s capture for %s", strategy, camera_entity_id)
+                    self._strategy_cache[camera_entity_id] = strategy
+                return content
+        
+        return None
     
     async def _capture_timelapse(
         self,
-        task_id: str,
+        rec: TimelapseRecord,
         camera_entity_id: str, 
         interval: int, 
         duration: int, 
@@ -380,17 +718,19 @@ class TimelapseCoordinator(DataUpdateCoordinator):
     ) -> None:
         """Capture frames for timelapse."""
         try:
-            start_time = dt_util.now()
-            end_time = start_time + timedelta(minutes=duration)
+            start_mono = time.monotonic()
+            total_secs = duration * 60
+            next_deadline = start_mono + interval
             
             frame_count = 0
+            frame_prefix = os.path.join(frame_dir, "frame_")
             
             _LOGGER.info("Starting timelapse capture for camera %s, frames every %d seconds for %d minutes", 
                       camera_entity_id, interval, duration)
             _LOGGER.info("Frames will be saved to %s", frame_dir)
             _LOGGER.info("Final timelapse will be saved as %s", output_file)
             
-            while dt_util.now() < end_time:
+            while (elapsed := time.monotonic() - start_mono) < total_secs:
                 try:
                     # Capture frame with retry mechanism
                     if self._debug:
@@ -402,201 +742,121 @@ class TimelapseCoordinator(DataUpdateCoordinator):
                     
                     # 优化重试机制，减少资源消耗
                     max_retries = 3
-                    retry_count = 0
-                    retry_delay = 2  # seconds
-                    # 递增重试延迟以减少系统压力
-                    retry_backoff = 1.5  # 每次重试增加1.5倍延迟
-                    image = None
+                    image_content = None
                     
-                    # 使用信号量限制并发请求
-                    camera_state = self.hass.states.get(camera_entity_id)
-                    if not camera_state or camera_state.state == "unavailable":
-                        _LOGGER.error("Camera %s is unavailable, skipping frame", camera_entity_id)
-                    else:
-                        while retry_count < max_retries:
-                            try:
-                                # 重新检查是否仍然可用，避免不必要的操作
-                                if retry_count > 0:
-                                    camera_state = self.hass.states.get(camera_entity_id)
-                                    if not camera_state or camera_state.state == "unavailable":
-                                        _LOGGER.error("Camera %s became unavailable, stopping retries", camera_entity_id)
-                                        break
-                                
-                                # 标准方法: 使用Home Assistant API，但减少超时时间
-                                try:
-                                    # 减少超时时间，避免长时间阻塞
-                                    image = await async_get_image(self.hass, camera_entity_id, timeout=7)
-                                    if image and image.content:
-                                        _LOGGER.debug("Successfully captured image using standard HA API")
-                                        break
-                                except Exception as e1:
-                                    _LOGGER.warning("Standard HA API failed: %s", e1)
-                                
-                                # 备选方法: 直接访问摄像头流
-                                if retry_count == max_retries - 1:  # 只在最后一次重试时尝试此方法，减少资源使用
-                                    try:
-                                        camera_data = self.hass.data.get("camera", {})
-                                        camera_entity = camera_data.get(camera_entity_id.split(".")[1], None)
-                                        
-                                        if camera_entity and hasattr(camera_entity, "stream_source"):
-                                            stream_source = camera_entity.stream_source
-                                            if stream_source and stream_source.startswith(("http://", "https://")):
-                                                _LOGGER.info("Trying direct stream access as last resort")
-                                                
-                                                # 使用更短的超时
-                                                async with aiohttp.ClientSession() as session:
-                                                    async with session.get(stream_source, timeout=7) as resp:
-                                                        if resp.status == 200:
-                                                            content = await resp.read()
-                                                            if content:
-                                                                from homeassistant.components.camera import Image
-                                                                image = Image(content, "image/jpeg")
-                                                                _LOGGER.info("Direct stream access successful")
-                                                                break
-                                    except Exception as e2:
-                                        _LOGGER.warning("Direct stream access failed: %s", e2)
-                                    
-                                # 增加重试延迟
-                                retry_count += 1
-                                if retry_count < max_retries:
-                                    current_delay = retry_delay * (retry_backoff ** (retry_count - 1))
-                                    _LOGGER.warning("Image capture failed, retrying (%d/%d) in %.1f seconds", 
-                                                  retry_count, max_retries, current_delay)
-                                    await asyncio.sleep(current_delay)
-                                else:
-                                    _LOGGER.error("Failed to capture frame after %d retries", max_retries)
-                            
-                            except Exception as e:
-                                retry_count += 1
-                                if retry_count < max_retries:
-                                    current_delay = retry_delay * (retry_backoff ** (retry_count - 1))
-                                    _LOGGER.warning("Failed to capture frame (%d/%d), retrying in %.1f seconds: %s", 
-                                                  retry_count, max_retries, current_delay, str(e))
-                                    await asyncio.sleep(current_delay)
-                                else:
-                                    _LOGGER.error("Failed to capture frame after %d retries: %s", 
-                                                max_retries, str(e))
+                    for attempt in range(max_retries):
+                        # 重新检查是否仍然可用，避免不必要的操作
+                        camera_state = self.hass.states.get(camera_entity_id)
+                        if not camera_state or camera_state.state == "unavailable":
+                            _LOGGER.error("Camera %s is unavailable, skipping frame", camera_entity_id)
+                            break
+                        
+                        # 只在最后一次重试时尝试备选方法，减少资源使用
+                        image_content = await self._capture_one_frame(
+                            camera_entity_id, fallback=attempt == max_retries - 1
+                        )
+                        if image_content:
+                            break
+                        
+                        # 增加重试延迟
+                        if attempt + 1 < max_retries:
+                            current_delay = _RETRY_DELAYS[attempt]
+                            _LOGGER.warning("Image capture failed, retrying (%d/%d) in %.1f seconds", 
+                                          attempt + 1, max_retries, current_delay)
+                            await asyncio.sleep(current_delay)
+                        else:
+                            _LOGGER.error("Failed to capture frame after %d retries", max_retries)
                     
-                    if not image or not image.content:
+                    if not image_content:
                         _LOGGER.error("No image content received from camera %s after retries", camera_entity_id)
-                        continue
-                    
-                    if self._debug:
-                        _LOGGER.debug("Image captured, size: %d bytes", len(image.content))
-                    
-                    # Save frame to file
-                    frame_path = os.path.join(frame_dir, f"frame_{frame_count:06d}.jpg")
-                    if self._debug:
-                        _LOGGER.debug("Saving frame to %s", frame_path)
-                    
-                    async with aiofiles.open(frame_path, "wb") as f:
-                        await f.write(image.content)
+                    else:
+                        if self._debug:
+                            _LOGGER.debug("Image captured, size: %d bytes", len(image_content))
                     
-                    # Verify file was written
-                    if os.path.exists(frame_path) and os.path.getsize(frame_path) > 0:
+                        # Save frame to file
+                        frame_path = f"{frame_prefix}{frame_count:06d}.jpg"
                         if self._debug:
-                            _LOGGER.debug("Frame saved successfully: %s (%d bytes)", 
-                                         frame_path, os.path.getsize(frame_path))
-                        frame_count += 1
-                    else:
-                        _LOGGER.error("Failed to save frame or file is empty: %s", frame_path)
+                            _LOGGER.debug("Saving frame to %s", frame_path)
                     
-                    # Update timelapse data
-                    elapsed = (dt_util.now() - start_time).total_seconds()
-                    total_duration = (end_time - start_time).total_seconds()
-                    progress = min(100, int(elapsed / total_duration * 100))
-                    time_remaining = max(0, total_duration - elapsed)
+                        written = await asyncio.to_thread(_write_bytes, frame_path, image_content)
+                    
+                        # Verify file was written
+                        if written == len(image_content):
+                            if self._debug:
+                                _LOGGER.debug("Frame saved successfully: %s (%d bytes)", 
+                                             frame_path, written)
+                            frame_count += 1
+                        else:
+                            _LOGGER.error("Failed to save frame, wrote %d of %d bytes: %s",
+                                          written, len(image_content), frame_path)
                     
-                    self._timelapse_data[camera_entity_id].update({
-                        "frames_captured": frame_count,
-                        "progress": progress,
-                        "time_remaining": int(time_remaining),
-                    })
+                    # Update timelapse data (elapsed as of this frame's capture start)
+                    progress = min(100, int(elapsed / total_secs * 100))
+                    time_remaining = max(0, total_secs - elapsed)
                     
-                    # Update task registry
-                    if task_id in self._task_registry:
-                        self._task_registry[task_id].update({
-                            "frames_captured": frame_count,
-                            "progress": progress,
-                            "time_remaining": int(time_remaining),
-                        })
+                    rec.frames_captured = frame_count
+                    rec.progress = progress
+                    rec.time_remaining = int(time_remaining)
                     
                     self.async_set_updated_data(self._timelapse_data)
                     
                 except HomeAssistantError as ha_err:
                     _LOGGER.error("Home Assistant error: %s", ha_err)
                     _LOGGER.exception("Home Assistant error details")
-                    # If we have a Home Assistant error, wait a bit longer before retrying
-                    await asyncio.sleep(min(interval, 10))
-                    continue
                 except Exception as e:
                     _LOGGER.error("Error capturing frame: %s", e)
                     _LOGGER.exception("Detailed exception information")
-                    # Try to continue with next frame after a short delay
-                    await asyncio.sleep(2)
-                    continue
                 
-                # Wait for next interval
-                if self._debug:
-                    _LOGGER.debug("Waiting %d seconds until next frame capture", interval)
-                await asyncio.sleep(interval)
+                # Wait for next scheduled capture; sleeping until a fixed
+                # deadline keeps capture latency from accumulating as drift
+                sleep_for = next_deadline - time.monotonic()
+                if sleep_for > 0:
+                    if self._debug:
+                        _LOGGER.debug("Waiting %.1f seconds until next frame capture", sleep_for)
+                    await asyncio.sleep(sleep_for)
+                else:
+                    _LOGGER.debug("Frame capture overran interval by %.1f seconds", -sleep_for)
+                    next_deadline = time.monotonic()
+                next_deadline += interval
             
             # Log completion of frame capture
             _LOGGER.info("Finished capturing frames for %s. Total frames: %d", 
                       camera_entity_id, frame_count)
             
             # Update status to processing
-            self._timelapse_data[camera_entity_id]["status"] = STATUS_PROCESSING
-            
-            # Update task registry
-            if task_id in self._task_registry:
-                self._task_registry[task_id]["status"] = STATUS_PROCESSING
-                self._task_registry[task_id]["progress"] = 95  # Processing status
+            rec.status = STATUS_PROCESSING
+            rec.progress = 95  # Processing status
             
             self.async_set_updated_data(self._timelapse_data)
             
             # Generate timelapse video
             _LOGGER.info("Starting timelapse generation from %d frames", frame_count)
-            media_url = await self._generate_timelapse(frame_dir, output_file)
+            media_url = await self._generate_timelapse(frame_dir, output_file, rec=rec)
             
             # Add media URL for frontend playback if available
             if media_url:
-                self._timelapse_data[camera_entity_id]["media_url"] = media_url
-                
-                # Update task registry
-                if task_id in self._task_registry:
-                    self._task_registry[task_id]["media_url"] = media_url
+                rec.media_url = media_url
                 
                 # 如果启用了 Google Photos 上传，上传视频
-                _LOGGER.info("检查是否启用了 Google Photos 上传: %s", self._upload_to_google_photos_enabled)
+                _LOGGER.info("检查是否启用了 Google Photos 上传: %s", self._upload_gp_enabled)
                 _LOGGER.info("Google Photos 相册: %s", self._google_photos_album)
                 _LOGGER.info("Google Photos 配置条目 ID: %s", self._google_photos_config_entry_id)
                 
-                if self._upload_to_google_photos_enabled:
+                if self._upload_gp_enabled:
                     _LOGGER.info("Google Photos 上传已启用，开始上传视频: %s", output_file)
-                    success = await self._upload_to_google_photos(output_file, task_id)
+                    success = await self._do_google_photos_upload(output_file, rec.task_id)
                     if success:
                         _LOGGER.info("成功上传视频到 Google Photos")
-                        self._timelapse_data[camera_entity_id]["google_photos_uploaded"] = True
-                        
-                        # Update task registry
-                        if task_id in self._task_registry:
-                            self._task_registry[task_id]["google_photos_uploaded"] = True
+                        rec.google_photos_uploaded = True
                     else:
                         _LOGGER.error("上传视频到 Google Photos 失败")
                 else:
                     _LOGGER.info("Google Photos 上传未启用，跳过上传")
             
             # Update status to completed
-            self._timelapse_data[camera_entity_id]["status"] = STATUS_IDLE
-            self._timelapse_data[camera_entity_id]["progress"] = 100
-            self._timelapse_data[camera_entity_id]["time_remaining"] = 0
-            
-            # Update task registry
-            if task_id in self._task_registry:
-                self._task_registry[task_id]["status"] = STATUS_IDLE
-                self._task_registry[task_id]["progress"] = 100
-                self._task_registry[task_id]["time_remaining"] = 0
+            rec.status = STATUS_IDLE
+            rec.progress = 100
+            rec.time_remaining = 0
                 
             _LOGGER.info("Timelapse processing complete for %s", camera_entity_id)
             
@@ -613,349 +873,591 @@ class TimelapseCoordinator(DataUpdateCoordinator):
         except Exception as e:
             _LOGGER.error("Error in timelapse: %s", e)
             _LOGGER.exception("Detailed timelapse error information")
-            self._timelapse_data[camera_entity_id]["status"] = STATUS_ERROR
-            self._timelapse_data[camera_entity_id]["error_message"] = str(e)
-            
-            # Update task registry
-            if task_id in self._task_registry:
-                self._task_registry[task_id]["status"] = STATUS_ERROR
-                self._task_registry[task_id]["error_message"] = str(e)
+            rec.status = STATUS_ERROR
+            rec.error_message = str(e)
                 
             self.async_set_updated_data(self._timelapse_data)
     
-    async def _generate_timelapse(self, frame_dir: str, output_file: str, cleanup_frames: bool = True) -> str:
-        """Generate timelapse video from frames."""
+    async def _capture_stream_timelapse(
+        self,
+        rec: TimelapseRecord,
+        camera_entity_id: str,
+        stream_source: str,
+        interval: int,
+        duration: int,
+        frame_dir: str,
+        output_file: str
+    ) -> None:
+        """Encode the timelapse in one ffmpeg process reading the RTSP stream.
+        
+        ffmpeg keeps one frame per interval and encodes it straight to H.264,
+        so no JPEG files are written or decoded again. If ffmpeg fails, the
+        rest of the window falls back to snapshot capture.
+        """
+        start_mono = time.monotonic()
+        total_secs = duration * 60
+        process = None
+        try:
+            ffmpeg_path = await self._async_get_ffmpeg()
+            encoder = await self._async_get_video_encoder(ffmpeg_path)
+            
+            # fps 滤镜按间隔取帧，setpts 将时间戳压缩为输出帧率
+            filters = [f"fps=1/{interval}"]
+            blend = _frame_blend_factor(total_secs // interval)
+            if blend > 1:
+                _LOGGER.info("Blending every %d frames into one output frame", blend)
+                filters.append(f"tmix=frames={blend},framestep={blend}")
+            filters.append(f"setpts=N/({TIMELAPSE_FPS}*TB)")
+            if encoder in _ENCODER_FILTERS:
+                filters.append(_ENCODER_FILTERS[encoder])
+            
+            input_args = (
+                "-rtsp_transport", "tcp",
+                "-timeout", str(_RTSP_SOCKET_TIMEOUT * 1_000_000),  # 套接字超时（微秒），摄像头无响应时退出
+                "-t", str(total_secs),  # 录制时长（输入端）
+                "-i", stream_source,
+                "-an",  # 不录制音频
+            )
+            # 长时间运行，只保留错误输出；分片MP4在中断时已写入部分仍可播放
+            template = _build_ffmpeg_cmd(ffmpeg_path, encoder, input_args, loglevel="error", progress=False)
+            substitutions = {
+                _ARG_FILTERS: ",".join(filters),
+                _ARG_CREATION_TIME: f"creation_time={dt_util.utcnow().strftime('%Y-%m-%dT%H:%M:%S')}",  # UTC
+                _ARG_OUTPUT: output_file,
+            }
+            cmd = [substitutions.get(arg, arg) for arg in template]
+            
+            _LOGGER.info("Starting stream timelapse for camera %s, frames every %d seconds for %d minutes",
+                         camera_entity_id, interval, duration)
+            _LOGGER.info("Final timelapse will be saved as %s", output_file)
+            
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdin=asyncio.subprocess.PIPE,  # 发送 "q" 让 ffmpeg 正常结束并写完文件
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                    limit=_FFMPEG_PIPE_LIMIT
+                )
+            except FileNotFoundError:
+                # ffmpeg disappeared since it was located; look it up again next time
+                self._ffmpeg_path = None
+                self._cmd_templates = None
+                raise
+            # 录制可能持续很久，只保留最后几行错误输出
+            stderr_task = asyncio.create_task(self._read_ffmpeg_progress(process, None, 0))
+            
+            # ffmpeg 运行期间定期更新进度
+            stopped_at_deadline = False
+            while process.returncode is None:
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=min(interval, 30))
+                except asyncio.TimeoutError:
+                    pass
+                elapsed = time.monotonic() - start_mono
+                # -t 按流时间戳计时，流停顿时 ffmpeg 不会自行结束，按实际时间兜底
+                if process.returncode is None and elapsed > total_secs + _STREAM_STOP_GRACE:
+                    _LOGGER.warning("Stream timelapse for %s ran %d seconds past its duration, stopping ffmpeg",
+                                    camera_entity_id, elapsed - total_secs)
+                    await self._stop_ffmpeg(process)
+                    stopped_at_deadline = True
+                elapsed = min(elapsed, total_secs)
+                rec.frames_captured = int(elapsed // interval)
+                rec.progress = min(100, int(elapsed / total_secs * 100))
+                rec.time_remaining = int(total_secs - elapsed)
+                self.async_set_updated_data(self._timelapse_data)
+            
+            error_lines = await stderr_task
+            # ffmpeg 报错时会输出带用户名密码的流地址，写入错误信息前去掉
+            stderr_text = _redact_credentials("\n".join(error_lines)) or "Unknown error"
+            if process.returncode != 0:
+                raise HomeAssistantError(
+                    f"ffmpeg exited with code {process.returncode}: {stderr_text}"
+                )
+            # ffmpeg 把 RTSP 读取错误和套接字超时当作输入结束，仍以 0 退出；
+            # 提前结束说明流已中断，抛出异常以回退到快照方式录制剩余时间
+            ran_for = time.monotonic() - start_mono
+            if not stopped_at_deadline and ran_for < total_secs - interval:
+                raise HomeAssistantError(
+                    f"ffmpeg stopped after {int(ran_for)} of {total_secs} seconds: {stderr_text}"
+                )
+            
+            _LOGGER.info("Finished stream timelapse for %s", camera_entity_id)
+            
+            rec.status = STATUS_PROCESSING
+            rec.progress = 95
+            self.async_set_updated_data(self._timelapse_data)
+            
+            media_url = await self._publish_timelapse(frame_dir, output_file)
+            if media_url:
+                rec.media_url = media_url
+                if self._upload_gp_enabled:
+                    success = await self._do_google_photos_upload(output_file, rec.task_id)
+                    if success:
+                        _LOGGER.info("成功上传视频到 Google Photos")
+                    else:
+                        _LOGGER.error("上传视频到 Google Photos 失败")
+            
+            rec.status = STATUS_IDLE
+            rec.progress = 100
+            rec.time_remaining = 0
+            _LOGGER.info("Timelapse completed and saved to: %s", output_file)
+            self.async_set_updated_data(self._timelapse_data)
+            
+        except asyncio.CancelledError:
+            _LOGGER.debug("Stream timelapse canceled for %s", camera_entity_id)
+            if process is not None:
+                await self._stop_ffmpeg(process)
+            
+        except Exception as e:
+            if process is not None:
+                await self._stop_ffmpeg(process)
+            remaining = total_secs - (time.monotonic() - start_mono)
+            message = _redact_credentials(str(e))
+            if rec.status != STATUS_RECORDING or remaining < interval:
+                _LOGGER.error("Error in stream timelapse: %s", message)
+                rec.status = STATUS_ERROR
+                rec.error_message = message
+                self.async_set_updated_data(self._timelapse_data)
+                return
+            
+            # 流编码失败时回退到快照方式，继续录制剩余时间
+            _LOGGER.warning("Stream timelapse failed for %s, falling back to snapshots: %s",
+                            camera_entity_id, message)
+            rec.streaming = False
+            # 保留已录制的流视频，快照部分编码完成后再拼接，避免被 -y 覆盖
+            stream_part = f"{os.path.splitext(output_file)[0]}_stream.mp4"
+            try:
+                st = await asyncio.to_thread(os.stat, output_file)
+            except FileNotFoundError:
+                pass
+            else:
+                if st.st_size:
+                    await asyncio.to_thread(os.replace, output_file, stream_part)
+                    rec.stream_part = stream_part
+            await self._capture_timelapse(
+                rec,
+                camera_entity_id,
+                interval,
+                remaining / 60,
+                frame_dir,
+                output_file
+            )
+    
+    async def _stop_ffmpeg(self, process: asyncio.subprocess.Process) -> None:
+        """Ask a running ffmpeg to quit so it finalizes the output, then wait for it."""
+        if process.returncode is not None:
+            return
+        try:
+            process.stdin.write(b"q")
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        try:
+            await asyncio.wait_for(process.wait(), timeout=_FFMPEG_STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            _LOGGER.warning("ffmpeg did not stop in time, terminating it")
+            process.terminate()
+            await process.wait()
+    
+    async def _async_get_ffmpeg(self) -> str:
+        """Return the ffmpeg path, locating it and logging its version once."""
+        if self._ffmpeg_path is not None:
+            return self._ffmpeg_path
+        
+        ffmpeg_path, version_info = await asyncio.to_thread(_locate_ffmpeg)
+        if not ffmpeg_path:
+            _LOGGER.error("ffmpeg not found in PATH or any common locations")
+            raise HomeAssistantError("ffmpeg not found, cannot create timelapse")
+        
+        _LOGGER.info("Using ffmpeg at %s", ffmpeg_path)
+        if version_info:
+            _LOGGER.info("FFmpeg version: %s", version_info)
+        else:
+            _LOGGER.warning("FFmpeg version check failed for %s", ffmpeg_path)
+        
+        self._ffmpeg_path = ffmpeg_path
+        return ffmpeg_path
+    
+    async def _async_get_video_encoder(self, ffmpeg_path: str) -> str:
+        """Return the H.264 encoder to use, probing hardware encoders once."""
+        if self._video_encoder is not None:
+            return self._video_encoder
+        
+        encoder = _SW_ENCODER
+        try:
+            process = await asyncio.create_subprocess_exec(
+                ffmpeg_path, "-hide_banner", "-encoders",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            stdout, _ = await process.communicate()
+            listed = stdout.decode(errors="replace")
+            
+            for candidate in _HW_ENCODERS:
+                if f" {candidate} " not in listed:
+                    continue
+                if candidate == "h264_vaapi" and not await asyncio.to_thread(os.path.exists, _VAAPI_DEVICE):
+                    continue
+                # ffmpeg lists encoders it was built with even when the
+                # hardware is absent, so confirm with a tiny test encode
+                if await self._async_test_encoder(ffmpeg_path, candidate):
+                    encoder = candidate
+                    break
+        except Exception as e:
+            _LOGGER.warning("Error probing hardware encoders, using %s: %s", _SW_ENCODER, e)
+        
+        _LOGGER.info("Using video encoder: %s", encoder)
+        self._video_encoder = encoder
+        return encoder
+    
+    async def _async_test_encoder(self, ffmpeg_path: str, encoder: str) -> bool:
+        """Return True if ffmpeg can encode a short test clip with encoder.
+
+        The test uses the same output arguments as a real encode, and an
+        option the encoder ignores counts as a failure.
+        """
+        filters = _ENCODER_FILTERS.get(encoder)
+        process = await asyncio.create_subprocess_exec(
+            ffmpeg_path, "-hide_banner", "-loglevel", "warning",
+            *_ENCODER_INPUT_ARGS.get(encoder, ()),
+            "-f", "lavfi", "-i", "color=c=black:s=256x256:d=0.2",
+            *(("-vf", filters) if filters else ()),
+            "-c:v", encoder,
+            *_ENCODER_OUTPUT_ARGS[encoder],
+            "-f", "null", "-",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        message = stderr.decode(errors="replace").strip()
+        if process.returncode != 0:
+            _LOGGER.debug("Encoder %s unavailable: %s", encoder, message)
+            return False
+        # ffmpeg 对编码器不支持的选项只输出警告，质量参数会被忽略
+        if "has not been used" in message:
+            _LOGGER.warning("Encoder %s ignores its quality options, not using it: %s", encoder, message)
+            return False
+        return True
+    
+    async def _generate_timelapse(
+        self,
+        frame_dir: str,
+        output_file: str,
+        cleanup_frames: bool = True,
+        rec: Optional[TimelapseRecord] = None
+    ) -> str:
+        """Generate timelapse video from frames, reporting encode progress on rec."""
         # Use ffmpeg to generate timelapse
         try:
             # Check if we have frames to process
-            frame_files = [f for f in os.listdir(frame_dir) if f.startswith("frame_") and f.endswith(".jpg")]
-            if not frame_files:
+            frame_count, first_frame, last_frame = await asyncio.to_thread(_scan_frame_range, frame_dir)
+            if not frame_count and rec and rec.stream_part:
+                # 回退后没有拍到快照，只发布流录制的部分
+                _LOGGER.warning("No frames captured after the stream failed, keeping the stream recording only")
+                await asyncio.to_thread(os.replace, rec.stream_part, output_file)
+                rec.stream_part = None
+                return await self._publish_timelapse(frame_dir, output_file, cleanup_frames)
+            if not frame_count:
                 _LOGGER.error("No frames found in %s, cannot create timelapse", frame_dir)
                 raise HomeAssistantError(f"No frames found in {frame_dir}, cannot create timelapse")
             
-            _LOGGER.info("Found %d frames in %s", len(frame_files), frame_dir)
+            _LOGGER.info("Found %d frames in %s", frame_count, frame_dir)
             
-            # Verify ffmpeg is available - with enhanced checking
-            import shutil
-            import subprocess
+            ffmpeg_path = await self._async_get_ffmpeg()
             
-            ffmpeg_path = shutil.which("ffmpeg")
-            if not ffmpeg_path:
-                _LOGGER.error("ffmpeg not found in PATH, cannot create timelapse")
-                
-                # Try to find ffmpeg in common locations
-                common_paths = [
-                    "/usr/bin/ffmpeg", 
-                    "/usr/local/bin/ffmpeg",
-                    "/bin/ffmpeg",
-                    "/opt/bin/ffmpeg",
-                    "/usr/sbin/ffmpeg"
-                ]
-                
-                for path in common_paths:
-                    if os.path.exists(path) and os.access(path, os.X_OK):
-                        _LOGGER.info("Found ffmpeg at alternate location: %s", path)
-                        ffmpeg_path = path
-                        break
-                
-                if not ffmpeg_path:
-                    _LOGGER.error("ffmpeg not found in any common locations")
-                    raise HomeAssistantError("ffmpeg not found, cannot create timelapse")
+            encoder = await self._async_get_video_encoder(ffmpeg_path)
+            if self._cmd_templates is None:
+                self._cmd_templates = _build_cmd_templates(ffmpeg_path, encoder)
+            pattern_template, concat_template = self._cmd_templates
             
-            _LOGGER.info("Using ffmpeg at %s", ffmpeg_path)
+            # 帧数远超视频长度时，在 ffmpeg 中合并相邻帧，避免输出过长的视频
+            filters = []
+            blend = _frame_blend_factor(frame_count)
+            if blend > 1:
+                _LOGGER.info("Blending every %d frames into one output frame", blend)
+                # setpts 重新排列时间戳，避免 -r 输出帧率把合并后的帧再复制回来
+                filters.append(f"tmix=frames={blend},framestep={blend},setpts=N/({TIMELAPSE_FPS}*TB)")
+            if encoder in _ENCODER_FILTERS:
+                filters.append(_ENCODER_FILTERS[encoder])
             
-            # Verify ffmpeg works
-            try:
-                version_process = await asyncio.create_subprocess_exec(
-                    ffmpeg_path, "-version",
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                
-                stdout, stderr = await version_process.communicate()
-                
-                if version_process.returncode == 0:
-                    version_info = stdout.decode().splitlines()[0]
-                    _LOGGER.info("FFmpeg version: %s", version_info)
-                else:
-                    _LOGGER.warning("FFmpeg version check failed: %s", stderr.decode() if stderr else "Unknown error")
-            except Exception as e:
-                _LOGGER.error("Error checking FFmpeg version: %s", e)
+            # 使用绝对路径
+            output_file = os.path.abspath(output_file)
+            _LOGGER.info("Output will be saved to: %s", output_file)
+            
+            # 命令模板中的占位参数
+            substitutions = {
+                _ARG_FILTERS: ",".join(filters) or "null",  # 帧合并及硬件上传滤镜
+                _ARG_CREATION_TIME: f"creation_time={dt_util.utcnow().strftime('%Y-%m-%dT%H:%M:%S')}",  # UTC
+                _ARG_OUTPUT: output_file,
+            }
             
             # Try multiple methods for generating the video
             # Method 1: Direct pattern approach
             _LOGGER.info("Trying to generate video using direct pattern method...")
             
-            # 优化视频生成，限制使用资源
-            # 确保帧按顺序排列
-            frame_files = sorted(frame_files)
-            first_frame = os.path.join(frame_dir, frame_files[0]) if frame_files else None
-            
-            if first_frame and os.path.exists(first_frame):
-                _LOGGER.info("First frame exists: %s", first_frame)
+            # 帧编号连续时直接使用文件名模式，否则使用 concat 列表跳过缺失的帧
+            concat_list = None
+            if last_frame - first_frame + 1 == frame_count:
+                _LOGGER.info("Frames are numbered contiguously from %d", first_frame)
                 
-                # 使用绝对路径
-                output_file = os.path.abspath(output_file)
                 frame_pattern = os.path.abspath(os.path.join(frame_dir, "frame_%06d.jpg"))
-                
-                _LOGGER.info("Output will be saved to: %s", output_file)
                 _LOGGER.info("Using frame pattern: %s", frame_pattern)
                 
-                # 优化ffmpeg命令，提高兼容性和质量
-                cmd = [
-                    ffmpeg_path,
-                    "-y",  # 覆盖现有文件
-                    "-framerate", "10",  # 输入帧率
-                    "-i", frame_pattern,  # 输入模式
-                    "-c:v", "libx264",  # 视频编码器
-                    "-preset", "medium",  # 使用更平衡的预设，提高兼容性
-                    "-crf", "23",  # 使用更好的质量，提高兼容性
-                    "-threads", str(MAX_FFMPEG_THREADS),  # 限制线程数，使用配置常量
-                    "-pix_fmt", "yuv420p",  # 像素格式
-                    "-movflags", "+faststart",  # 优化网络播放
-                    "-profile:v", "high",  # 使用高配置文件提高兼容性
-                    "-level", "4.0",  # 提高级别
-                    "-metadata", f"creation_time={datetime.now().strftime('%Y-%m-%dT%H:%M:%S')}",  # 添加创建时间元数据
-                    "-metadata", "encoder=Home Assistant Camera Timelapse",  # 添加编码器信息
-                    output_file
-                ]
+                substitutions[_ARG_INPUT] = frame_pattern
+                substitutions[_ARG_START_NUMBER] = str(first_frame)
+                template = pattern_template
             else:
-                _LOGGER.warning("Cannot find first frame, falling back to concat method")
-                
-                # 方法2：使用concat方法和显式文件列表
-                input_list_path = os.path.join(frame_dir, "input_list.txt")
+                _LOGGER.warning("Frame sequence has gaps, falling back to concat method")
                 
-                # 使用异步IO写入文件列表，减少阻塞
-                try:
-                    # 使用配置常量限制帧数，避免内存问题
-                    max_files = min(len(frame_files), MAX_FRAME_BATCH)
-                    if len(frame_files) > max_files:
-                        _LOGGER.warning("Too many frames (%d), limiting to %d frames", len(frame_files), max_files)
-                        # 使用均匀采样，确保覆盖整个时间段
-                        if max_files > 1:
-                            step = len(frame_files) / max_files
-                            frame_files = [frame_files[int(i * step)] for i in range(max_files)]
-                        else:
-                            frame_files = [frame_files[0]]
-                    
-                    async with aiofiles.open(input_list_path, "w") as f:
-                        for frame in frame_files:
-                            full_path = os.path.join(frame_dir, frame)
-                            await f.write(f"file '{os.path.abspath(full_path)}'\n")
-                    _LOGGER.info("Created input file list at %s with %d entries", input_list_path, len(frame_files))
-                except Exception as e:
-                    _LOGGER.error("Error creating input file list: %s", e)
-                    raise HomeAssistantError(f"Error creating input file list: {str(e)}")
-                
-                # 优化ffmpeg命令，提高兼容性和质量
-                cmd = [
-                    ffmpeg_path,
-                    "-y",  # 覆盖现有文件
-                    "-f", "concat",
-                    "-safe", "0",
-                    "-i", input_list_path,
-                    "-c:v", "libx264",  # 视频编码器
-                    "-preset", "medium",  # 使用更平衡的预设，提高兼容性
-                    "-crf", "23",  # 使用更好的质量，提高兼容性
-                    "-threads", str(MAX_FFMPEG_THREADS),  # 使用配置常量限制线程数
-                    "-pix_fmt", "yuv420p",  # 像素格式
-                    "-r", "10",  # 输出帧率
-                    "-movflags", "+faststart",  # 优化网络播放
-                    "-profile:v", "high",  # 使用高配置文件提高兼容性
-                    "-level", "4.0",  # 提高级别
-                    "-metadata", f"creation_time={datetime.now().strftime('%Y-%m-%dT%H:%M:%S')}",  # 添加创建时间元数据
-                    "-metadata", "encoder=Home Assistant Camera Timelapse",  # 添加编码器信息
-                    output_file
-                ]
+                # 方法2：使用concat方法，通过stdin传入显式文件列表，每帧指定显示时长
+                frame_prefix = os.path.abspath(frame_dir).replace("'", "'\\''") + os.sep
+                frame_duration = 1 / TIMELAPSE_FPS
+                frame_files = await asyncio.to_thread(_scan_frames, frame_dir)
+                concat_list = "".join(
+                    f"file '{frame_prefix}{frame}'\nduration {frame_duration}\n"
+                    for frame in frame_files
+                ).encode()
+                _LOGGER.info("Passing %d frames to ffmpeg via concat list", len(frame_files))
+                template = concat_template
+            
+            cmd = [substitutions.get(arg, arg) for arg in template]
             
             # Log the frames before processing
-            _LOGGER.info("Frame files found (first 5):")
-            for frame in frame_files[:5]:
-                file_path = os.path.join(frame_dir, frame)
-                file_size = os.path.getsize(file_path)
+            _LOGGER.info("Frame files found (sample of 5):")
+            for frame, file_size in await asyncio.to_thread(_sample_frames, frame_dir, 5):
                 _LOGGER.info("  - %s (%d bytes)", frame, file_size)
             
-            _LOGGER.debug("Executing ffmpeg command: %s", " ".join(cmd))
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug("Executing ffmpeg command: %s", " ".join(cmd))
             
             _LOGGER.info("Starting FFmpeg process to generate timelapse video...")
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            async with _ENCODE_SEMAPHORE:
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        *cmd,
+                        stdin=asyncio.subprocess.PIPE if concat_list else asyncio.subprocess.DEVNULL,
+                        stdout=asyncio.subprocess.DEVNULL,
+                        stderr=asyncio.subprocess.PIPE,
+                        limit=_FFMPEG_PIPE_LIMIT
+                    )
+                except FileNotFoundError:
+                    # ffmpeg disappeared since it was located; look it up again next time
+                    self._ffmpeg_path = None
+                    self._cmd_templates = None
+                    raise
+                
+                output_frames = math.ceil(frame_count / blend)
+                error_lines, _ = await asyncio.gather(
+                    self._read_ffmpeg_progress(process, rec, output_frames),
+                    self._feed_ffmpeg_stdin(process, concat_list),
+                )
+                await process.wait()
+            
+            if process.returncode != 0:
+                stderr_text = "\n".join(error_lines) or "Unknown error"
+                _LOGGER.error("Error generating timelapse (return code %d)", process.returncode)
+                for line in error_lines:
+                    _LOGGER.error("FFmpeg error detail: %s", line)
+                
+                raise HomeAssistantError(f"Failed to generate timelapse: {stderr_text}")
+            
+        except Exception as e:
+            _LOGGER.error("Error generating timelapse: %s", e)
+            _LOGGER.exception("Detailed exception information")
+            raise HomeAssistantError(f"Failed to generate timelapse: {str(e)}")
+        
+        if rec and rec.stream_part:
+            await self._join_stream_part(rec.stream_part, output_file)
+            rec.stream_part = None
+        
+        return await self._publish_timelapse(frame_dir, output_file, cleanup_frames)
+    
+    async def _join_stream_part(self, stream_part: str, output_file: str) -> None:
+        """Prepend the stream recording to the snapshot video in output_file.
+        
+        Snapshots can differ in size from the stream, so the snapshot part is
+        scaled to match and both are encoded again. If joining fails, the
+        stream recording is left next to output_file.
+        """
+        joined = f"{os.path.splitext(output_file)[0]}_joined.mp4"
+        try:
+            ffmpeg_path = await self._async_get_ffmpeg()
+            encoder = await self._async_get_video_encoder(ffmpeg_path)
+            
+            filters = "[1:v][0:v]scale2ref[b][a];[a]setsar=1[a1];[b]setsar=1[b1];[a1][b1]concat=n=2:v=1:a=0"
+            if encoder in _ENCODER_FILTERS:
+                filters += "," + _ENCODER_FILTERS[encoder]
+            
+            # 快照部分缩放到流的尺寸后拼接
+            input_args = ("-i", stream_part, "-i", output_file)
+            template = _build_ffmpeg_cmd(
+                ffmpeg_path, encoder, input_args,
+                filter_option="-filter_complex", loglevel="error", progress=False
             )
+            substitutions = {
+                _ARG_FILTERS: filters,
+                _ARG_CREATION_TIME: f"creation_time={dt_util.utcnow().strftime('%Y-%m-%dT%H:%M:%S')}",  # UTC
+                _ARG_OUTPUT: joined,
+            }
+            cmd = [substitutions.get(arg, arg) for arg in template]
             
-            stdout, stderr = await process.communicate()
+            _LOGGER.info("Joining stream recording %s with snapshot timelapse %s", stream_part, output_file)
+            async with _ENCODE_SEMAPHORE:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                    limit=_FFMPEG_PIPE_LIMIT
+                )
+                error_lines = await self._read_ffmpeg_progress(process, None, 0)
+                await process.wait()
             
             if process.returncode != 0:
-                stderr_text = stderr.decode() if stderr else "Unknown error"
-                _LOGGER.error("Error generating timelapse (return code %d): %s", 
-                              process.returncode, stderr_text)
+                raise HomeAssistantError("\n".join(error_lines) or "Unknown error")
+            
+            await asyncio.to_thread(os.replace, joined, output_file)
+            await asyncio.to_thread(os.remove, stream_part)
+        except Exception as e:
+            _LOGGER.warning("Could not join the stream recording, keeping it as %s: %s", stream_part, e)
+            try:
+                await asyncio.to_thread(os.remove, joined)
+            except FileNotFoundError:
+                pass
+    
+    async def _feed_ffmpeg_stdin(self, process: asyncio.subprocess.Process, data: Optional[bytes]) -> None:
+        """Write data to ffmpeg's stdin and close it."""
+        if data is None:
+            return
+        try:
+            process.stdin.write(data)
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg exited early; its stderr explains why
+            pass
+        finally:
+            process.stdin.close()
+    
+    async def _read_ffmpeg_progress(
+        self,
+        process: asyncio.subprocess.Process,
+        rec: Optional[TimelapseRecord],
+        total_frames: int
+    ) -> deque:
+        """Parse ffmpeg -progress records from stderr until it closes.
+        
+        Encoded frame counts move rec.progress from its current value towards
+        99. Any other stderr output is returned, keeping only the last lines.
+        """
+        error_lines = deque(maxlen=_FFMPEG_ERROR_LINES)
+        base = rec.progress if rec else 0
+        async for raw in process.stderr:
+            line = raw.decode(errors="replace").rstrip()
+            key, sep, value = line.partition("=")
+            if not sep or " " in key:
+                if line:
+                    error_lines.append(line)
+                continue
+            if key == "frame" and rec and total_frames and value.isdigit():
+                progress = base + (99 - base) * min(int(value), total_frames) // total_frames
+                if progress != rec.progress:
+                    rec.progress = progress
+                    self.async_set_updated_data(self._timelapse_data)
+        return error_lines
+    
+    async def _publish_timelapse(self, frame_dir: str, output_file: str, cleanup_frames: bool = True) -> str:
+        """Verify the encoded video, expose it as a media source and clean up frames."""
+        try:
+            # ffmpeg 成功退出即可认为文件有效，只需一次 stat 确认文件存在且非空
+            try:
+                st = await asyncio.to_thread(os.stat, output_file)
+            except FileNotFoundError:
+                _LOGGER.error("Output file does not exist: %s", output_file)
                 
-                # Log more detailed debug info
-                if stderr:
-                    stderr_lines = stderr_text.splitlines()
-                    for line in stderr_lines[:20]:  # Log first 20 lines at most
-                        _LOGGER.error("FFmpeg error detail: %s", line)
+                # Check if directory exists and is writable
+                output_dir = os.path.dirname(output_file)
+                try:
+                    await asyncio.to_thread(os.stat, output_dir)
+                except FileNotFoundError:
+                    _LOGGER.error("Output directory does not exist: %s", output_dir)
+                else:
+                    if not await asyncio.to_thread(os.access, output_dir, os.W_OK):
+                        _LOGGER.error("Output directory is not writable: %s", output_dir)
                 
-                raise HomeAssistantError(f"Failed to generate timelapse: {stderr_text}")
+                raise HomeAssistantError(f"Output file does not exist: {output_file}")
             
-            if stdout:
-                stdout_text = stdout.decode()
-                _LOGGER.debug("FFmpeg stdout: %s", stdout_text)
+            if not st.st_size:
+                _LOGGER.error("Output file exists but is empty: %s", output_file)
+                raise HomeAssistantError(f"Output file exists but is empty: {output_file}")
             
-            # Create a short delay to ensure file system operations complete
-            await asyncio.sleep(2)
+            _LOGGER.info("Timelapse generated successfully: %s (%d bytes)", output_file, st.st_size)
             
-            # Verify the output file exists and has content
+            # Create media source URL for frontend playback
             try:
-                if os.path.exists(output_file):
-                    file_size = os.path.getsize(output_file)
-                    if file_size > 0:
-                        _LOGGER.info("Timelapse generated successfully: %s (%d bytes)", 
-                                    output_file, file_size)
+                filename = os.path.basename(output_file)
+                
+                # Try both media locations
+                media_source_url = None
+                
+                # 1. If output path starts with /media/local
+                if output_file.startswith("/media/local/"):
+                    relative_path = output_file[len("/media/local/"):]
+                    media_source_url = f"media-source://media_source/local/{relative_path}"
+                    _LOGGER.info("Using relative media path: %s", relative_path)
+                    
+                # 2. If using /media directory
+                elif output_file.startswith("/media/"):
+                    relative_path = output_file[len("/media/"):]
+                    media_source_url = f"media-source://media_source/{relative_path}"
+                    _LOGGER.info("Using media path: %s", relative_path)
+                    
+                # 3. Fallback to direct filename
+                else:
+                    # Copy the file to media directory as fallback (使用异步IO来减少阻塞)
+                    fallback_path = f"/media/local/timelapses/{filename}"
+                    await asyncio.to_thread(os.makedirs, os.path.dirname(fallback_path), exist_ok=True)
+                    
+                    _LOGGER.info("Copying file to media directory: %s (%d bytes)", fallback_path, st.st_size)
+                    try:
+                        # 在线程中硬链接或零拷贝复制，避免把整个文件读入内存
+                        await asyncio.to_thread(_link_or_copy, output_file, fallback_path)
                         
-                        # Additional verification - try to open the file
-                        try:
-                            with open(output_file, 'rb') as f:
-                                # Read first few bytes to verify file is accessible
-                                header = f.read(16)
-                                _LOGGER.debug("File header verification: %s", header.hex())
-                        except Exception as e:
-                            _LOGGER.warning("File exists but cannot be opened: %s", e)
-                            
-                        # Create media source URL for frontend playback
+                        media_source_url = f"media-source://media_source/local/timelapses/{filename}"
+                        
+                        # Update output_file to the new path
+                        output_file = fallback_path
+                        _LOGGER.info("File copied successfully to media directory")
+                    except Exception as copy_err:
+                        _LOGGER.error("Failed to copy file to media directory: %s", copy_err)
+                        # Still use the original output file
+                        media_source_url = f"media-source://media_source/local/timelapses/{filename}"
+                
+                if media_source_url:
+                    _LOGGER.info("Media source URL for playback: %s", media_source_url)
+                    
+                    # 优化清理过程，避免阻塞主线程
+                    if cleanup_frames:
                         try:
-                            filename = os.path.basename(output_file)
+                            _LOGGER.info("Cleaning up temporary frame files in %s", frame_dir)
                             
-                            # Try both media locations
-                            media_source_url = None
+                            # 帧目录只属于本次任务，在一个线程中整体删除
+                            await asyncio.to_thread(shutil.rmtree, frame_dir)
+                            _LOGGER.info("Removed frame directory %s", frame_dir)
                             
-                            # 1. If output path starts with /media/local
-                            if output_file.startswith("/media/local/"):
-                                relative_path = output_file[len("/media/local/"):]
-                                media_source_url = f"media-source://media_source/local/{relative_path}"
-                                _LOGGER.info("Using relative media path: %s", relative_path)
-                                
-                            # 2. If using /media directory
-                            elif output_file.startswith("/media/"):
-                                relative_path = output_file[len("/media/"):]
-                                media_source_url = f"media-source://media_source/{relative_path}"
-                                _LOGGER.info("Using media path: %s", relative_path)
-                                
-                            # 3. Fallback to direct filename
-                            else:
-                                # Copy the file to media directory as fallback (使用异步IO来减少阻塞)
-                                fallback_path = f"/media/local/timelapses/{filename}"
-                                await self.to_thread(os.makedirs, os.path.dirname(fallback_path), exist_ok=True)
-                                
-                                _LOGGER.info("Copying file to media directory: %s", fallback_path)
-                                try:
-                                    # 使用异步拷贝提高性能，避免阻塞主线程
-                                    async def async_copy_file(src, dst):
-                                        async with aiofiles.open(src, 'rb') as fsrc:
-                                            content = await fsrc.read()
-                                            async with aiofiles.open(dst, 'wb') as fdst:
-                                                await fdst.write(content)
-                                    
-                                    # 如果文件过大，可能需要限制内存使用
-                                    file_size = os.path.getsize(output_file)
-                                    if file_size > 50 * 1024 * 1024:  # 超过50MB时使用不同的拷贝方法
-                                        _LOGGER.info("Large file detected (%d MB), using chunked copy", file_size/1024/1024)
-                                        # 对于大文件，使用子进程进行复制，避免阻塞
-                                        import shutil
-                                        await self.to_thread(shutil.copy2, output_file, fallback_path)
-                                    else:
-                                        # 对于小文件，使用异步IO
-                                        await async_copy_file(output_file, fallback_path)
-                                    
-                                    media_source_url = f"media-source://media_source/local/timelapses/{filename}"
-                                    
-                                    # Update output_file to the new path
-                                    output_file = fallback_path
-                                    _LOGGER.info("File copied successfully to media directory")
-                                except Exception as copy_err:
-                                    _LOGGER.error("Failed to copy file to media directory: %s", copy_err)
-                                    # Still use the original output file
-                                    media_source_url = f"media-source://media_source/local/timelapses/{filename}"
-                            
-                            if media_source_url:
-                                _LOGGER.info("Media source URL for playback: %s", media_source_url)
-                                
-                                # 优化清理过程，避免阻塞主线程
-                                if cleanup_frames:
-                                    try:
-                                        _LOGGER.info("Cleaning up temporary frame files in %s", frame_dir)
-                                        
-                                        # 使用异步批量操作，减少IO压力
-                                        async def async_cleanup():
-                                            # 使用列表推导更高效地获取文件列表
-                                            frame_files = [f for f in await self.to_thread(os.listdir, frame_dir) 
-                                                          if f.startswith("frame_") and f.endswith(".jpg")]
-                                            
-                                            # 批量删除文件，每批最多100个文件
-                                            batch_size = 100
-                                            for i in range(0, len(frame_files), batch_size):
-                                                batch = frame_files[i:i+batch_size]
-                                                delete_tasks = []
-                                                for frame in batch:
-                                                    file_path = os.path.join(frame_dir, frame)
-                                                    delete_tasks.append(self.to_thread(os.remove, file_path))
-                                                
-                                                # 并行执行删除操作
-                                                if delete_tasks:
-                                                    await asyncio.gather(*delete_tasks)
-                                            
-                                            # 删除输入列表文件
-                                            input_list_path = os.path.join(frame_dir, "input_list.txt")
-                                            if await self.to_thread(os.path.exists, input_list_path):
-                                                await self.to_thread(os.remove, input_list_path)
-                                                
-                                            # 尝试删除空目录
-                                            try:
-                                                await self.to_thread(os.rmdir, frame_dir)
-                                                _LOGGER.info("Removed empty frame directory %s", frame_dir)
-                                            except OSError:
-                                                _LOGGER.warning("Could not remove frame directory %s, it may not be empty", frame_dir)
-                                        
-                                        # 执行异步清理
-                                        await async_cleanup()
-                                        
-                                    except Exception as cleanup_err:
-                                        _LOGGER.warning("Error cleaning up frame files: %s", cleanup_err)
-                                
-                                return media_source_url
-                        except Exception as e:
-                            _LOGGER.error("Error creating media URL: %s", e)
-                    else:
-                        _LOGGER.error("Output file exists but is empty: %s", output_file)
-                        raise HomeAssistantError(f"Output file exists but is empty: {output_file}")
-                else:
-                    _LOGGER.error("Output file does not exist: %s", output_file)
+                        except Exception as cleanup_err:
+                            _LOGGER.warning("Error cleaning up frame files: %s", cleanup_err)
                     
-                    # Check if directory exists and is writable
-                    output_dir = os.path.dirname(output_file)
-                    if not os.path.exists(output_dir):
-                        _LOGGER.error("Output directory does not exist: %s", output_dir)
-                    elif not os.access(output_dir, os.W_OK):
-                        _LOGGER.error("Output directory is not writable: %s", output_dir)
-                    
-                    raise HomeAssistantError(f"Output file does not exist: {output_file}")
-            except Exception as check_err:
-                _LOGGER.error("Error checking output file: %s", check_err)
-                raise HomeAssistantError(f"Error checking output file: {str(check_err)}")
+                    return media_source_url
+            except Exception as e:
+                _LOGGER.error("Error creating media URL: %s", e)
             
         except Exception as e:
             _LOGGER.error("Error generating timelapse: %s", e)
             _LOGGER.exception("Detailed exception information")
             raise HomeAssistantError(f"Failed to generate timelapse: {str(e)}")
     
-    async def _to_thread_compat(self, func, *args, **kwargs):
-        """兼容Python 3.8的to_thread实现."""
-        loop = asyncio.get_event_loop()
-        func_call = partial(func, *args, **kwargs)
-        return await loop.run_in_executor(None, func_call)
-    
-    async def _upload_to_google_photos(self, output_file: str, task_id: Optional[str] = None) -> bool:
+    async def _do_google_photos_upload(self, output_file: str, task_id: Optional[str] = None) -> bool:
         """上传视频到 Google Photos.
         
         Args:
@@ -965,37 +1467,35 @@ class TimelapseCoordinator(DataUpdateCoordinator):
         Returns:
             成功时返回True，否则返回False
         """
-        if not self._upload_to_google_photos_enabled:
+        if not self._upload_gp_enabled:
             _LOGGER.debug("Google Photos 上传未启用")
             return False
             
+        rec = None
         try:
             _LOGGER.info("正在上传延时摄影视频到 Google Photos: %s", output_file)
             _LOGGER.info("Google Photos 相册: %s", self._google_photos_album)
             _LOGGER.info("Google Photos 配置条目 ID: %s", self._google_photos_config_entry_id)
             
-            # 检查文件是否存在
-            import os
-            if not os.path.exists(output_file):
+            # 检查文件是否存在，在线程中 stat 避免阻塞事件循环
+            try:
+                file_size = (await asyncio.to_thread(os.stat, output_file)).st_size
+            except FileNotFoundError:
                 _LOGGER.error("文件不存在: %s", output_file)
                 return False
             
-            file_size = os.path.getsize(output_file)
             _LOGGER.info("文件大小: %d 字节 (%.2f MB)", file_size, file_size / (1024 * 1024))
             
             # 更新状态为上传中
-            camera_entity_id = None
-            for entity_id, data in self._timelapse_data.items():
-                if data.get("output_file") == output_file:
-                    data["status"] = STATUS_UPLOADING
-                    camera_entity_id = entity_id
-                    if not task_id:
-                        task_id = data.get("task_id")
-                    break
-                    
-            if task_id and task_id in self._task_registry:
-                self._task_registry[task_id]["status"] = STATUS_UPLOADING
-                self._task_registry[task_id]["progress"] = 97  # 上传状态
+            rec = self._task_registry.get(task_id) if task_id else None
+            if rec is None:
+                rec = next(
+                    (r for r in self._task_registry.values() if r.output_file == output_file),
+                    None,
+                )
+            if rec:
+                rec.status = STATUS_UPLOADING
+                rec.progress = 97  # 上传状态
             
             self.async_set_updated_data(self._timelapse_data)
             
@@ -1005,37 +1505,31 @@ class TimelapseCoordinator(DataUpdateCoordinator):
                 _LOGGER.error(error_msg)
                 
                 # 更新状态
-                if camera_entity_id and camera_entity_id in self._timelapse_data:
-                    self._timelapse_data[camera_entity_id]["status"] = STATUS_IDLE
-                    self._timelapse_data[camera_entity_id]["error_message"] = error_msg
-                    
-                if task_id and task_id in self._task_registry:
-                    self._task_registry[task_id]["status"] = STATUS_IDLE
-                    self._task_registry[task_id]["error_message"] = error_msg
+                if rec:
+                    rec.status = STATUS_IDLE
+                    rec.error_message = error_msg
                 
                 self.async_set_updated_data(self._timelapse_data)
                 return False
             
-            # 使用官方集成上传视频
+            # 使用官方集成上传视频，同一时间只上传一个文件以限制内存占用
             _LOGGER.info("调用 async_upload_to_google_photos 函数")
-            success = await async_upload_to_google_photos(
-                self.hass,
-                output_file, 
-                self._google_photos_album,
-                self._google_photos_config_entry_id
-            )
+            async with _UPLOAD_SEMAPHORE:
+                success = await async_upload_to_google_photos(
+                    self.hass,
+                    output_file, 
+                    self._google_photos_album,
+                    self._google_photos_config_entry_id,
+                    file_size=file_size
+                )
             
             if success:
                 _LOGGER.info("成功上传到 Google Photos")
                 
                 # 更新状态
-                if camera_entity_id and camera_entity_id in self._timelapse_data:
-                    self._timelapse_data[camera_entity_id]["google_photos_uploaded"] = True
-                    self._timelapse_data[camera_entity_id]["status"] = STATUS_IDLE
-                    
-                if task_id and task_id in self._task_registry:
-                    self._task_registry[task_id]["google_photos_uploaded"] = True
-                    self._task_registry[task_id]["status"] = STATUS_IDLE
+                if rec:
+                    rec.google_photos_uploaded = True
+                    rec.status = STATUS_IDLE
                     
                 self.async_set_updated_data(self._timelapse_data)
                 return True
@@ -1044,13 +1538,9 @@ class TimelapseCoordinator(DataUpdateCoordinator):
                 _LOGGER.error(error_msg)
                 
                 # 更新状态
-                if camera_entity_id and camera_entity_id in self._timelapse_data:
-                    self._timelapse_data[camera_entity_id]["status"] = STATUS_IDLE
-                    self._timelapse_data[camera_entity_id]["error_message"] = error_msg
-                    
-                if task_id and task_id in self._task_registry:
-                    self._task_registry[task_id]["status"] = STATUS_IDLE
-                    self._task_registry[task_id]["error_message"] = error_msg
+                if rec:
+                    rec.status = STATUS_IDLE
+                    rec.error_message = error_msg
                 
                 self.async_set_updated_data(self._timelapse_data)
                 return False
@@ -1062,13 +1552,9 @@ class TimelapseCoordinator(DataUpdateCoordinator):
             _LOGGER.error(traceback.format_exc())
             
             # 更新状态
-            if camera_entity_id and camera_entity_id in self._timelapse_data:
-                self._timelapse_data[camera_entity_id]["status"] = STATUS_IDLE
-                self._timelapse_data[camera_entity_id]["error_message"] = error_msg
-                
-            if task_id and task_id in self._task_registry:
-                self._task_registry[task_id]["status"] = STATUS_IDLE
-                self._task_registry[task_id]["error_message"] = error_msg
+            if rec:
+                rec.status = STATUS_IDLE
+                rec.error_message = error_msg
             
             self.async_set_updated_data(self._timelapse_data)
             return False
@@ -1090,7 +1576,7 @@ class TimelapseCoordinator(DataUpdateCoordinator):
             raise HomeAssistantError(f"Task ID {task_id} does not exist")
             
         # If the task is active, stop it first
-        camera_entity_id = self._task_registry[task_id].get("camera_entity_id")
+        camera_entity_id = self._task_registry[task_id].camera_entity_id
         if camera_entity_id and camera_entity_id in self._timelapse_tasks:
             if not self._timelapse_tasks[camera_entity_id].done():
                 await self.stop_timelapse(camera_entity_id, task_id)
@@ -1,20 +1,297 @@
 """Google Photos integration for Camera Timelapse."""
 from __future__ import annotations
 
+import asyncio
+import functools
+import inspect
 import logging
-from typing import Optional
+import os
+import re
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Tuple
 
-from homeassistant.core import HomeAssistant
+import aiohttp
+
+from homeassistant.config_entries import SIGNAL_CONFIG_ENTRY_CHANGED, ConfigEntry, ConfigEntryChange
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import HomeAssistantError
-from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers import config_entry_oauth2_flow
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.storage import Store
+import homeassistant.util.dt as dt_util
+
+from .const import DOMAIN
+
+# 旧版本集成提供可直接调用的上传函数，新版本只提供 upload 服务
+try:
+    from homeassistant.components.google_photos import async_upload_file
+except ImportError:
+    async_upload_file = None
+
+try:
+    from homeassistant.components.google_photos.const import DOMAIN as GOOGLE_PHOTOS_DOMAIN
+except ImportError:
+    GOOGLE_PHOTOS_DOMAIN = "google_photos"
 
 _LOGGER = logging.getLogger(__name__)
 
+_UPLOAD_SERVICE = "upload"
+
+# Upload function picked by _get_uploader once the integration is available
+_uploader: Optional[Callable[..., Awaitable[bool]]] = None
+
+# 上传服务错误信息中表示触发 Google Photos 配额限制的完整词组，不匹配单独的数字
+_RATE_LIMIT_PATTERN = re.compile(
+    r"\b(?:RESOURCE_EXHAUSTED|HTTP 429|Too Many Requests|Quota exceeded|Rate limit exceeded)\b",
+    re.IGNORECASE,
+)
+# Retries after a rate-limited upload, doubling the wait from the base delay
+_RATE_LIMIT_RETRIES = 3
+_RATE_LIMIT_BACKOFF = 2.0  # seconds
+
+# 已上传文件索引，保存在 hass.data[DOMAIN] 中并持久化，重试时跳过已上传的文件
+_INDEX_KEY = "uploaded_index"
+_INDEX_STORE_KEY = "uploaded_index_store"
+_INDEX_STORAGE_KEY = f"{DOMAIN}.uploaded_index"
+_INDEX_STORAGE_VERSION = 1
+_INDEX_SAVE_DELAY = 5  # seconds, coalesces index writes
+
+# 大文件直接使用 Library API 的可恢复上传协议分块上传
+_API_BASE = "https://photoslibrary.googleapis.com/v1"
+_RESUMABLE_THRESHOLD = 10 * 1024 * 1024  # bytes
+_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # bytes, rounded down to the server's granularity
+_CHUNK_RETRIES = 3
+# 共用 Home Assistant 的连接池，同时最多向 Library API 发起 4 个请求
+_API_REQUEST_SEMAPHORE = asyncio.Semaphore(4)
+
+# 账户列表缓存，Google Photos 配置条目变化时清除
+_ACCOUNTS_CACHE_KEY = "_gphotos_accounts_cache"
+_ACCOUNTS_LISTENER_KEY = "_gphotos_accounts_listener"
+
+# Album IDs by (Google Photos config entry ID, album title)
+_album_ids: Dict[Tuple[str, str], str] = {}
+
+class GooglePhotosApiError(HomeAssistantError):
+    """Library API request answered with an HTTP error status."""
+
+    def __init__(self, action: str, status: int, text: str) -> None:
+        """Initialize with the failed action, HTTP status and response body."""
+        super().__init__(f"Google Photos {action} failed (HTTP {status}): {text[:200]}")
+        self.status = status
+
+@functools.lru_cache(maxsize=4)
+def _supports_config_entry(upload_func: Callable[..., Any]) -> bool:
+    """Return whether upload_func accepts config_entry_id.
+    
+    Cached per function object, so a reloaded integration is probed again.
+    """
+    return "config_entry_id" in inspect.signature(upload_func).parameters
+
+def _is_rate_limited(err: Exception) -> bool:
+    """Return True if err is a Google Photos rate limit or quota error.
+    
+    Errors carrying an HTTP status are decided by the status alone; service
+    errors only have a message, which must contain a whole rate-limit token.
+    """
+    while err is not None:
+        status = getattr(err, "status", None)
+        if isinstance(status, int):
+            return status == 429
+        if _RATE_LIMIT_PATTERN.search(str(err)):
+            return True
+        err = err.__cause__
+    return False
+
+def _prune_index(index: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the index entries whose file still exists."""
+    return {
+        key: uploaded
+        for key, uploaded in index.items()
+        if os.path.exists(key.partition("|")[2])
+    }
+
+def _read_chunk(path: str, offset: int, size: int) -> bytes:
+    """Read size bytes of path starting at offset."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+@asynccontextmanager
+async def _async_api_request(
+    session: aiohttp.ClientSession, method: str, url: str, action: str, **kwargs: Any
+) -> AsyncIterator[aiohttp.ClientResponse]:
+    """Send a Library API request, raising GooglePhotosApiError if it failed."""
+    async with _API_REQUEST_SEMAPHORE, session.request(method, url, **kwargs) as resp:
+        if resp.status >= 400:
+            raise GooglePhotosApiError(action, resp.status, await resp.text())
+        yield resp
+
+async def _async_get_access_token(hass: HomeAssistant, config_entry_id: Optional[str]) -> Tuple[str, str]:
+    """Return (config entry ID, valid access token) for the Google Photos account."""
+    if config_entry_id:
+        entry = hass.config_entries.async_get_entry(config_entry_id)
+    else:
+        entries = hass.config_entries.async_entries(GOOGLE_PHOTOS_DOMAIN)
+        entry = entries[0] if entries else None
+    if entry is None or entry.domain != GOOGLE_PHOTOS_DOMAIN:
+        raise HomeAssistantError("No Google Photos account is configured")
+    
+    implementation = await config_entry_oauth2_flow.async_get_config_entry_implementation(hass, entry)
+    oauth_session = config_entry_oauth2_flow.OAuth2Session(hass, entry, implementation)
+    await oauth_session.async_ensure_token_valid()
+    return entry.entry_id, oauth_session.token["access_token"]
+
+async def _async_get_album_id(
+    session: aiohttp.ClientSession, headers: Dict[str, str], entry_id: str, album_name: str
+) -> str:
+    """Return the ID of the album titled album_name, creating it if needed."""
+    key = (entry_id, album_name)
+    if key in _album_ids:
+        return _album_ids[key]
+    
+    params = {"pageSize": "50"}
+    while True:
+        async with _async_api_request(
+            session, "GET", f"{_API_BASE}/albums", "album listing", headers=headers, params=params
+        ) as resp:
+            data = await resp.json()
+        for album in data.get("albums", []):
+            if album.get("title") == album_name:
+                _album_ids[key] = album["id"]
+                return album["id"]
+        if not data.get("nextPageToken"):
+            break
+        params["pageToken"] = data["nextPageToken"]
+    
+    _LOGGER.info("Creating Google Photos album: %s", album_name)
+    async with _async_api_request(
+        session, "POST", f"{_API_BASE}/albums", "album creation",
+        headers=headers, json={"album": {"title": album_name}}
+    ) as resp:
+        album = await resp.json()
+    _album_ids[key] = album["id"]
+    return album["id"]
+
+async def _async_query_upload_offset(
+    session: aiohttp.ClientSession, upload_url: str, headers: Dict[str, str]
+) -> int:
+    """Return how many bytes of a resumable upload the server has received."""
+    async with _async_api_request(
+        session, "POST", upload_url, "upload status query",
+        headers={**headers, "Content-Length": "0", "X-Goog-Upload-Command": "query"},
+    ) as resp:
+        return int(resp.headers.get("X-Goog-Upload-Size-Received", 0))
+
+async def _async_resumable_upload(
+    hass: HomeAssistant,
+    file_path: str,
+    file_size: int,
+    album_name: Optional[str],
+    config_entry_id: Optional[str]
+) -> bool:
+    """Upload a large file in chunks with the Library API resumable protocol.
+    
+    A chunk that fails with a network error is retried from the offset the
+    server reports, so only the unconfirmed part is sent again.
+    """
+    entry_id, access_token = await _async_get_access_token(hass, config_entry_id)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    session = async_get_clientsession(hass)
+    
+    # 1. 开始上传会话
+    async with _async_api_request(
+        session, "POST", f"{_API_BASE}/uploads", "upload start",
+        headers={
+            **headers,
+            "Content-Length": "0",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Content-Type": "video/mp4",
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Raw-Size": str(file_size),
+        },
+    ) as resp:
+        upload_url = resp.headers["X-Goog-Upload-URL"]
+        granularity = int(resp.headers.get("X-Goog-Upload-Chunk-Granularity", _UPLOAD_CHUNK_SIZE))
+    chunk_size = max(granularity, _UPLOAD_CHUNK_SIZE // granularity * granularity)
+    
+    # 2. 分块上传，最后一块同时结束会话并返回 upload token
+    _LOGGER.info("Uploading %s to Google Photos in %d byte chunks", file_path, chunk_size)
+    offset = 0
+    failures = 0
+    upload_token = None
+    while upload_token is None:
+        size = min(chunk_size, file_size - offset)
+        last = offset + size >= file_size
+        data = await asyncio.to_thread(_read_chunk, file_path, offset, size)
+        try:
+            async with _async_api_request(
+                session, "POST", upload_url, "chunk upload",
+                headers={
+                    **headers,
+                    "X-Goog-Upload-Command": "upload, finalize" if last else "upload",
+                    "X-Goog-Upload-Offset": str(offset),
+                },
+                data=data,
+            ) as resp:
+                if last:
+                    upload_token = await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            failures += 1
+            if failures > _CHUNK_RETRIES:
+                raise HomeAssistantError(f"Google Photos chunk upload failed: {err}") from err
+            _LOGGER.warning("Chunk upload at offset %d failed, resuming (%d/%d): %s",
+                            offset, failures, _CHUNK_RETRIES, err)
+            offset = await _async_query_upload_offset(session, upload_url, headers)
+            continue
+        offset += size
+        failures = 0
+    
+    # 3. 创建媒体项目并加入相册
+    body: Dict[str, Any] = {
+        "newMediaItems": [
+            {"simpleMediaItem": {"uploadToken": upload_token, "fileName": os.path.basename(file_path)}}
+        ]
+    }
+    if album_name:
+        body["albumId"] = await _async_get_album_id(session, headers, entry_id, album_name)
+    
+    async with _async_api_request(
+        session, "POST", f"{_API_BASE}/mediaItems:batchCreate", "media item creation",
+        headers=headers, json=body
+    ) as resp:
+        result = await resp.json()
+    
+    status = result.get("newMediaItemResults", [{}])[0].get("status", {})
+    if status.get("code", 0) != 0:
+        _LOGGER.error("Google Photos rejected %s: %s", file_path, status.get("message"))
+        return False
+    
+    _LOGGER.info("Successfully uploaded file to Google Photos via resumable upload")
+    return True
+
+async def _async_get_uploaded_index(hass: HomeAssistant) -> Tuple[Dict[str, Any], Store]:
+    """Return the uploaded-file index and its store, loading it on first use."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if _INDEX_KEY not in domain_data:
+        store = Store(hass, _INDEX_STORAGE_VERSION, _INDEX_STORAGE_KEY)
+        loaded = await store.async_load() or {}
+        # 视频文件删除后不会再重复上传，移除其记录，避免索引无限增长
+        pruned = await asyncio.to_thread(_prune_index, loaded)
+        # 加载期间可能已有其他上传完成初始化，以先完成的为准
+        domain_data.setdefault(_INDEX_STORE_KEY, store)
+        index = domain_data.setdefault(_INDEX_KEY, pruned)
+        if index is pruned and len(pruned) != len(loaded):
+            _LOGGER.debug("Pruned %d uploaded-file entries for deleted videos", len(loaded) - len(pruned))
+            domain_data[_INDEX_STORE_KEY].async_delay_save(lambda: index, _INDEX_SAVE_DELAY)
+    return domain_data[_INDEX_KEY], domain_data[_INDEX_STORE_KEY]
+
 async def async_upload_to_google_photos(
     hass: HomeAssistant, 
     file_path: str, 
     album_name: Optional[str] = None,
-    config_entry_id: Optional[str] = None
+    config_entry_id: Optional[str] = None,
+    file_size: Optional[int] = None
 ) -> bool:
     """Upload a file to Google Photos using the official integration.
     
@@ -23,93 +300,208 @@ async def async_upload_to_google_photos(
         file_path: Path to the file to upload
         album_name: Optional album name to add the file to
         config_entry_id: Optional config entry ID to specify which Google Photos account to use
+        file_size: Optional size of the file if the caller already knows it
         
     Returns:
         True if successful, False otherwise
     """
     try:
-        _LOGGER.info("Uploading file to Google Photos: %s", file_path)
-        
-        # Check if Google Photos integration is configured
-        if "google_photos" not in hass.config.components:
-            _LOGGER.error("Google Photos integration is not configured in Home Assistant")
-            return False
-            
-        # Try to use the Google Photos service to upload the file
-        try:
-            # Check if the upload service is available
-            service_domain = "google_photos"
-            service_name = "upload"
-            
-            if not hass.services.has_service(service_domain, service_name):
-                _LOGGER.error("Google Photos upload service is not available")
-                _LOGGER.info("Available Google Photos services: %s", 
-                           [s for s in hass.services.async_services().get(service_domain, {}).keys()])
-                return False
-            
-            # Prepare service data
-            service_data = {
-                "filename": file_path,
-            }
-            
-            if album_name:
-                service_data["album"] = album_name
-                
-            if config_entry_id:
-                service_data["config_entry_id"] = config_entry_id
-            
-            _LOGGER.info("Calling Google Photos upload service with data: %s", service_data)
-            
-            # Call the service
-            await hass.services.async_call(
-                service_domain,
-                service_name,
-                service_data,
-                blocking=True
-            )
-            
-            _LOGGER.info("Successfully uploaded file to Google Photos via service")
-            return True
-            
-        except Exception as service_err:
-            _LOGGER.error("Failed to upload via Google Photos service: %s", service_err)
-            
-            # Fallback: Try direct import approach (for older versions)
-            try:
-                from homeassistant.components.google_photos import async_upload_file
-                _LOGGER.info("Trying direct function call as fallback")
-                
-                # 检查函数签名，看是否支持 config_entry_id 参数
-                import inspect
-                sig = inspect.signature(async_upload_file)
-                supports_config_entry = "config_entry_id" in sig.parameters
-                
-                # 使用官方集成上传文件
-                if supports_config_entry and config_entry_id:
-                    _LOGGER.info("Using specific Google Photos config entry: %s", config_entry_id)
-                    result = await async_upload_file(hass, file_path, album_name, config_entry_id=config_entry_id)
-                else:
-                    if config_entry_id:
-                        _LOGGER.warning("Config entry ID specified but not supported by Google Photos integration")
-                    result = await async_upload_file(hass, file_path, album_name)
-                
-                if result:
-                    _LOGGER.info("Successfully uploaded file to Google Photos via direct function")
-                    return True
-                else:
-                    _LOGGER.error("Failed to upload file to Google Photos via direct function")
-                    return False
-                    
-            except ImportError as import_err:
-                _LOGGER.error("Failed to import Google Photos integration: %s", import_err)
-                _LOGGER.error("The Google Photos integration may not support direct file uploads from custom components")
-                _LOGGER.info("Please check if the Google Photos integration is properly installed and configured")
-                return False
-            
+        return await _async_upload_file(hass, file_path, album_name, config_entry_id, file_size)
     except Exception as err:
         _LOGGER.error("Error uploading file to Google Photos: %s", err)
         return False
 
+async def _async_upload_file(
+    hass: HomeAssistant,
+    file_path: str,
+    album_name: Optional[str],
+    config_entry_id: Optional[str],
+    file_size: Optional[int] = None
+) -> bool:
+    """Upload one file unless the same account already received it.
+    
+    Raises the service error if the upload was rate limited.
+    """
+    index, store = await _async_get_uploaded_index(hass)
+    key = f"{config_entry_id or ''}|{os.path.abspath(file_path)}"
+    if key in index:
+        _LOGGER.info("File was already uploaded to Google Photos, skipping: %s", file_path)
+        return True
+    
+    if not await _async_send_file(hass, file_path, album_name, config_entry_id, file_size):
+        return False
+    
+    index[key] = dt_util.utcnow().isoformat()
+    store.async_delay_save(lambda: index, _INDEX_SAVE_DELAY)
+    return True
+
+async def _async_service_uploader(
+    hass: HomeAssistant,
+    file_path: str,
+    album_name: Optional[str],
+    config_entry_id: Optional[str]
+) -> bool:
+    """Upload a file with the google_photos.upload service."""
+    # Prepare service data, leaving out unset optional fields
+    service_data = {
+        key: value
+        for key, value in (
+            ("filename", file_path),
+            ("album", album_name),
+            ("config_entry_id", config_entry_id),
+        )
+        if value
+    }
+
+    _LOGGER.info("Calling Google Photos upload service with data: %s", service_data)
+
+    # Call the service; errors, including rate limits, propagate to the caller
+    await hass.services.async_call(
+        GOOGLE_PHOTOS_DOMAIN,
+        _UPLOAD_SERVICE,
+        service_data,
+        blocking=True
+    )
+
+    _LOGGER.info("Successfully uploaded file to Google Photos via service")
+    return True
+
+async def _async_direct_uploader(
+    hass: HomeAssistant,
+    file_path: str,
+    album_name: Optional[str],
+    config_entry_id: Optional[str]
+) -> bool:
+    """Upload a file with async_upload_file from older Google Photos integrations."""
+    # 使用官方集成上传文件，函数签名检查结果会被缓存
+    if config_entry_id and _supports_config_entry(async_upload_file):
+        _LOGGER.info("Using specific Google Photos config entry: %s", config_entry_id)
+        result = await async_upload_file(hass, file_path, album_name, config_entry_id=config_entry_id)
+    else:
+        if config_entry_id:
+            _LOGGER.warning("Config entry ID specified but not supported by Google Photos integration")
+        result = await async_upload_file(hass, file_path, album_name)
+
+    if result:
+        _LOGGER.info("Successfully uploaded file to Google Photos via direct function")
+        return True
+    _LOGGER.error("Failed to upload file to Google Photos via direct function")
+    return False
+
+async def _async_no_uploader(
+    hass: HomeAssistant,
+    file_path: str,
+    album_name: Optional[str],
+    config_entry_id: Optional[str]
+) -> bool:
+    """Report that no way to upload files is available."""
+    _LOGGER.error("Google Photos upload service is not available")
+    if _LOGGER.isEnabledFor(logging.INFO):
+        _LOGGER.info("Available Google Photos services: %s", 
+                   list(hass.services.async_services_for_domain(GOOGLE_PHOTOS_DOMAIN)))
+    _LOGGER.info("Please check if the Google Photos integration is properly installed and configured")
+    return False
+
+def _get_uploader(hass: HomeAssistant) -> Callable[..., Awaitable[bool]]:
+    """Return the upload function to use, choosing it on first successful probe."""
+    global _uploader
+    if _uploader is not None:
+        return _uploader
+
+    if hass.services.has_service(GOOGLE_PHOTOS_DOMAIN, _UPLOAD_SERVICE):
+        _uploader = _async_service_uploader
+    elif async_upload_file is not None:
+        _uploader = _async_direct_uploader
+    else:
+        # 集成可能尚未加载完成，不缓存，下次重新检查
+        return _async_no_uploader
+    return _uploader
+
+async def _async_send_file(
+    hass: HomeAssistant,
+    file_path: str,
+    album_name: Optional[str],
+    config_entry_id: Optional[str],
+    file_size: Optional[int] = None
+) -> bool:
+    """Upload one file, raising the upload error if it was rate limited."""
+    _LOGGER.info("Uploading file to Google Photos: %s", file_path)
+
+    # Check if Google Photos integration is configured
+    if GOOGLE_PHOTOS_DOMAIN not in hass.config.components:
+        _LOGGER.error("Google Photos integration is not configured in Home Assistant")
+        return False
+
+    # 大文件优先使用可恢复上传，失败时回退到上传服务
+    if file_size is None:
+        file_size = await asyncio.to_thread(os.path.getsize, file_path)
+    if file_size > _RESUMABLE_THRESHOLD:
+        try:
+            return await _async_resumable_upload(hass, file_path, file_size, album_name, config_entry_id)
+        except Exception as err:
+            if _is_rate_limited(err):
+                raise
+            _LOGGER.warning("Resumable upload failed, falling back to the upload service: %s", err)
+
+    return await _get_uploader(hass)(hass, file_path, album_name, config_entry_id)
+
+async def async_upload_many(
+    hass: HomeAssistant,
+    files: Iterable[str],
+    album_name: Optional[str] = None,
+    config_entry_id: Optional[str] = None,
+    concurrency: int = 2,
+    min_interval: float = 0.1
+) -> Dict[str, bool]:
+    """Upload several files to Google Photos.
+    
+    At most concurrency uploads run at once and consecutive uploads start at
+    least min_interval seconds apart. Rate-limited uploads are retried with
+    exponential backoff.
+    
+    Args:
+        hass: Home Assistant instance
+        files: Paths of the files to upload
+        album_name: Optional album name to add the files to
+        config_entry_id: Optional config entry ID to specify which Google Photos account to use
+        concurrency: Maximum number of uploads in flight
+        min_interval: Minimum seconds between the start of two uploads
+        
+    Returns:
+        Dict mapping each path to True if it was uploaded, False otherwise
+    """
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+    gate = asyncio.Lock()
+    last_start = loop.time() - min_interval
+    
+    async def upload(file_path: str) -> bool:
+        nonlocal last_start
+        async with sem:
+            for attempt in range(_RATE_LIMIT_RETRIES + 1):
+                # 控制上传开始的最小间隔
+                async with gate:
+                    wait = last_start + min_interval - loop.time()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    last_start = loop.time()
+                
+                try:
+                    return await _async_upload_file(hass, file_path, album_name, config_entry_id)
+                except Exception as err:
+                    if not _is_rate_limited(err) or attempt == _RATE_LIMIT_RETRIES:
+                        _LOGGER.error("Error uploading %s to Google Photos: %s", file_path, err)
+                        return False
+                    delay = _RATE_LIMIT_BACKOFF * 2 ** attempt
+                    _LOGGER.warning("Google Photos rate limit reached, retrying %s in %.0f seconds",
+                                    file_path, delay)
+                    await asyncio.sleep(delay)
+        return False
+    
+    paths = list(files)
+    results = await asyncio.gather(*(upload(path) for path in paths))
+    return dict(zip(paths, results))
+
 async def async_get_google_photos_accounts(hass: HomeAssistant) -> list[dict]:
     """Get a list of configured Google Photos accounts.
     
@@ -119,21 +511,34 @@ async def async_get_google_photos_accounts(hass: HomeAssistant) -> list[dict]:
     Returns:
         List of dicts with account info (entry_id, title)
     """
-    accounts = []
-    
     # Check if Google Photos integration is configured
-    if "google_photos" not in hass.config.components:
+    if GOOGLE_PHOTOS_DOMAIN not in hass.config.components:
         _LOGGER.warning("Google Photos integration is not configured in Home Assistant")
+        return []
+    
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    accounts = domain_data.get(_ACCOUNTS_CACHE_KEY)
+    if accounts is not None:
         return accounts
     
-    # Get all config entries for Google Photos
-    from homeassistant.components.google_photos.const import DOMAIN as GOOGLE_PHOTOS_DOMAIN
+    if _ACCOUNTS_LISTENER_KEY not in domain_data:
+        @callback
+        def _async_entry_changed(change: ConfigEntryChange, entry: ConfigEntry) -> None:
+            """Drop the cached accounts when a Google Photos entry changes."""
+            if entry.domain == GOOGLE_PHOTOS_DOMAIN:
+                domain_data.pop(_ACCOUNTS_CACHE_KEY, None)
+        
+        domain_data[_ACCOUNTS_LISTENER_KEY] = async_dispatcher_connect(
+            hass, SIGNAL_CONFIG_ENTRY_CHANGED, _async_entry_changed
+        )
     
-    for entry in hass.config_entries.async_entries(GOOGLE_PHOTOS_DOMAIN):
-        account_info = {
+    # Get all config entries for Google Photos
+    accounts = [
+        {
             "entry_id": entry.entry_id,
             "title": entry.title or f"Google Photos ({entry.entry_id})"
         }
-        accounts.append(account_info)
-    
+        for entry in hass.config_entries.async_entries(GOOGLE_PHOTOS_DOMAIN)
+    ]
+    domain_data[_ACCOUNTS_CACHE_KEY] = accounts
     return accounts
\ No newline at end of file
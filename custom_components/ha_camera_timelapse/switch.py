@@ -22,13 +22,29 @@ from .const import (
     ATTR_ERROR_MESSAGE,
     ATTR_MEDIA_URL,
     ATTR_TASKS,
-    STATUS_IDLE,
     STATUS_RECORDING,
 )
 from .coordinator import TimelapseCoordinator
 
 _LOGGER = logging.getLogger(__name__)
 
+# TimelapseRecord fields exposed as state attributes; the ATTR_* names
+# match the record's field names
+_ATTR_KEYS = (
+    ATTR_STATUS,
+    ATTR_PROGRESS,
+    ATTR_FRAMES_CAPTURED,
+    ATTR_TIME_REMAINING,
+    ATTR_OUTPUT_FILE,
+    "interval",
+    "duration",
+    "start_time",
+    "end_time",
+    "task_id",
+)
+# Fields only exposed when set
+_OPTIONAL_ATTR_KEYS = (ATTR_ERROR_MESSAGE, ATTR_MEDIA_URL)
+
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
@@ -51,7 +67,7 @@ class TimelapseSwitch(CoordinatorEntity, SwitchEntity):
         self.config_entry = entry
         
         self._camera_entity_id = entry.data.get(CONF_CAMERA_ENTITY_ID)
-        camera_name = self._camera_entity_id.split(".")[1]
+        _, _, camera_name = self._camera_entity_id.partition(".")
         
         # Set entity info
         self._attr_unique_id = f"{entry.entry_id}_timelapse_switch"
@@ -72,9 +88,8 @@ class TimelapseSwitch(CoordinatorEntity, SwitchEntity):
     @property
     def is_on(self) -> bool:
         """Return true if timelapse is recording."""
-        if self._camera_entity_id in self.coordinator.data:
-            return self.coordinator.data[self._camera_entity_id].get("status") == STATUS_RECORDING
-        return False
+        rec = self.coordinator.data.get(self._camera_entity_id)
+        return rec is not None and rec.status == STATUS_RECORDING
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Start timelapse recording."""
@@ -91,41 +106,19 @@ class TimelapseSwitch(CoordinatorEntity, SwitchEntity):
     @property
     def extra_state_attributes(self) -> Optional[Dict[str, Any]]:
         """Return the state attributes."""
-        attrs = {}
+        rec = self.coordinator.data.get(self._camera_entity_id)
+        if rec is None:
+            return {}
+        
+        attrs = {key: getattr(rec, key) for key in _ATTR_KEYS}
+        
+        # Add error message and media URL if present
+        for key in _OPTIONAL_ATTR_KEYS:
+            if value := getattr(rec, key):
+                attrs[key] = value
         
-        if self._camera_entity_id in self.coordinator.data:
-            timelapse_data = self.coordinator.data[self._camera_entity_id]
-            attrs.update({
-                ATTR_STATUS: timelapse_data.get("status", STATUS_IDLE),
-                ATTR_PROGRESS: timelapse_data.get("progress", 0),
-                ATTR_FRAMES_CAPTURED: timelapse_data.get("frames_captured", 0),
-                ATTR_TIME_REMAINING: timelapse_data.get("time_remaining", 0),
-            })
-            
-            # Add error message if present
-            if "error_message" in timelapse_data and timelapse_data["error_message"]:
-                attrs[ATTR_ERROR_MESSAGE] = timelapse_data["error_message"]
-            
-            if "output_file" in timelapse_data:
-                attrs[ATTR_OUTPUT_FILE] = timelapse_data["output_file"]
-                
-            if "media_url" in timelapse_data:
-                attrs[ATTR_MEDIA_URL] = timelapse_data["media_url"]
-                
-            # Add other useful attributes
-            if "interval" in timelapse_data:
-                attrs["interval"] = timelapse_data["interval"]
-            if "duration" in timelapse_data:
-                attrs["duration"] = timelapse_data["duration"]
-            if "start_time" in timelapse_data:
-                attrs["start_time"] = timelapse_data["start_time"]
-            if "end_time" in timelapse_data:
-                attrs["end_time"] = timelapse_data["end_time"]
-            if "task_id" in timelapse_data:
-                attrs["task_id"] = timelapse_data["task_id"]
-            
-            # Add task list attribute if available
-            if ATTR_TASKS in self.coordinator.data:
-                attrs[ATTR_TASKS] = self.coordinator.data[ATTR_TASKS]
+        # Add task list attribute if available
+        if ATTR_TASKS in self.coordinator.data:
+            attrs[ATTR_TASKS] = self.coordinator.data[ATTR_TASKS]
         
         return attrs
\ No newline at end of file